@@ -2,138 +2,225 @@
 """
 Script to check the availability and versions of HPC Python dependencies.
 Displays a table with package information and CUDA support where applicable.
+
+Versions are read from the installed package metadata without importing the
+packages. The CUDA checks import cupy, jax and numba and initialize their
+backends, which takes seconds and can hang on a broken GPU driver, so they
+run in parallel subprocesses with a timeout. The results are cached, keyed
+by a fingerprint of the interpreter, the installed versions, the NVIDIA
+driver and the environment variables that select devices. Repeated runs in
+the same environment skip the probes. Use --json for provisioning scripts.
 """
 
-import sys
-from importlib import import_module
-from packaging import version
+import argparse
+import hashlib
+import json
+import os
 import subprocess
-from rich.console import Console
-from rich.table import Table
-from rich.panel import Panel
-from rich import print as rprint
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import metadata
+from importlib.util import find_spec
+from pathlib import Path
 
-def get_package_version(package_name):
-    """Get the version of an installed package."""
-    try:
-        module = import_module(package_name)
-        return getattr(module, '__version__', 'N/A')
-    except ImportError:
-        return None
+# List of packages to check
+PACKAGES = {
+    'numpy': 'NumPy',
+    'numba': 'Numba',
+    'jax': 'JAX',
+    'cupy': 'CuPy',
+    'sklearn': 'scikit-learn',
+    'networkx': 'NetworkX',
+    'matplotlib': 'Matplotlib',
+}
+
+# Check for dependencies with CUDA support, each probe prints its status
+CUDA_PROBES = {
+    'cupy': "import cupy as cp\n"
+            "print('Yes' if cp.cuda.is_available() else 'No')",
+    'jax': "import jax\n"
+           "devices = jax.devices()\n"
+           "has_gpu = any('gpu' in str(d).lower() or 'cuda' in str(d).lower()"
+           " for d in devices)\n"
+           "print('Yes' if has_gpu else 'CPU only')",
+    'numba': "from numba import cuda\n"
+             "print('Yes' if cuda.is_available() else 'No')",
+}
+
+# environment variables that change what the CUDA probes find
+ENV_VARS = ['CUDA_VISIBLE_DEVICES', 'CUDA_HOME', 'CUDA_PATH', 'JAX_PLATFORMS',
+            'XLA_FLAGS', 'NUMBA_DISABLE_CUDA', 'LD_LIBRARY_PATH']
 
-def check_cuda_support():
-    """Check if CUDA is available for GPU packages."""
-    cuda_info = {}
-    
-    # Check CUDA for CuPy
+CACHE_FILE = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache'),
+                  'workshop_hpcpy', 'check_dependencies.json')
+
+
+def get_package_version(package_name, distributions):
+    """Get the version of an installed package, None if it is missing.
+
+    `distributions` maps import names to distribution names (e.g. cupy to
+    cupy-cuda12x), as returned by `importlib.metadata.packages_distributions`.
+    """
+    for dist in distributions.get(package_name, []):
+        try:
+            return metadata.version(dist)
+        except metadata.PackageNotFoundError:
+            pass
+    # installed without metadata, e.g. on PYTHONPATH
+    return 'N/A' if find_spec(package_name) is not None else None
+
+
+def probe_cuda(package_name, timeout):
+    """Run the CUDA probe of a package in a subprocess, returns the status
+    and the time it took."""
+    start = time.perf_counter()
     try:
-        import cupy as cp
-        if cp.cuda.is_available():
-            cuda_info['cupy'] = 'Yes'
-        else:
-            cuda_info['cupy'] = 'No'
-    except ImportError:
-        cuda_info['cupy'] = 'N/A'
-    
-    # Check CUDA for JAX
+        result = subprocess.run([sys.executable, '-c', CUDA_PROBES[package_name]],
+                                capture_output=True, text=True, timeout=timeout)
+        lines = result.stdout.strip().splitlines()
+        status = lines[-1] if result.returncode == 0 and lines else 'Error'
+    except subprocess.TimeoutExpired:
+        status = 'Timeout'
+    return status, time.perf_counter() - start
+
+
+def fingerprint(versions):
+    """Hash of everything the check results depend on."""
+    driver = Path('/proc/driver/nvidia/version')
+    state = {
+        'python': sys.executable,
+        'version': sys.version,
+        'packages': versions,
+        'env': {var: os.environ.get(var) for var in ENV_VARS},
+        'driver': driver.read_text() if driver.exists() else None,
+    }
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode()).hexdigest()
+
+
+def load_cache(key):
     try:
-        import jax
-        devices = jax.devices()
-        has_gpu = any('gpu' in str(d).lower() or 'cuda' in str(d).lower() for d in devices)
-        cuda_info['jax'] = 'Yes' if has_gpu else 'CPU only'
-    except ImportError:
-        cuda_info['jax'] = 'N/A'
-    
-    # Check CUDA for Numba
+        cache = json.loads(CACHE_FILE.read_text())
+    except (OSError, ValueError):
+        return None
+    return cache['results'] if cache.get('fingerprint') == key else None
+
+
+def save_cache(key, results):
     try:
-        from numba import cuda
-        if cuda.is_available():
-            cuda_info['numba'] = 'Yes'
-        else:
-            cuda_info['numba'] = 'No'
-    except (ImportError, AttributeError):
-        cuda_info['numba'] = 'N/A'
-    
-    return cuda_info
+        CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        CACHE_FILE.write_text(json.dumps({'fingerprint': key, 'results': results}))
+    except OSError:
+        pass
+
+
+def check_packages(timeout=30.0, use_cache=True):
+    """
+    Versions and CUDA support of PACKAGES.
+
+    Returns (results, cached), results maps the package names to dicts with
+    the display name, the version (None if missing), the CUDA support ('-'
+    for packages without CUDA), the probe time of this run in seconds and,
+    if the CUDA support comes from the cache, the probe time of the run
+    that filled it (else None).
+    """
+    results = {}
+    distributions = metadata.packages_distributions()
+    for package_name, display_name in PACKAGES.items():
+        start = time.perf_counter()
+        version_str = get_package_version(package_name, distributions)
+        results[package_name] = {
+            'name': display_name,
+            'version': version_str,
+            'cuda': '-' if package_name not in CUDA_PROBES else 'N/A',
+            'probe_time': time.perf_counter() - start,
+            'cached_probe_time': None,
+        }
+
+    key = fingerprint({name: r['version'] for name, r in results.items()})
+    if use_cache:
+        cached = load_cache(key)
+        if cached is not None:
+            for name, r in cached.items():
+                results[name]['cuda'] = r['cuda']
+                results[name]['cached_probe_time'] = r['probe_time']
+            return results, True
+
+    # Get CUDA information
+    probed = [name for name in CUDA_PROBES if results[name]['version'] is not None]
+    if probed:
+        with ThreadPoolExecutor(max_workers=len(probed)) as pool:
+            probes = pool.map(lambda name: probe_cuda(name, timeout), probed)
+            for name, (status, seconds) in zip(probed, probes):
+                results[name]['cuda'] = status
+                results[name]['probe_time'] += seconds
+
+    # a hanging or failing probe is retried next time
+    if use_cache and not any(results[name]['cuda'] in ('Timeout', 'Error')
+                             for name in probed):
+        save_cache(key, {name: {'cuda': r['cuda'], 'probe_time': r['probe_time']}
+                         for name, r in results.items()})
+    return results, False
+
+
+def print_report(results, cached):
+    """Display the results as tables."""
+    from rich.console import Console
+    from rich.table import Table
+    from rich.panel import Panel
 
-def main():
-    """Main function to check and display dependency information."""
-    
     console = Console()
-    
-    # List of packages to check
-    packages = {
-        'numpy': 'NumPy',
-        'numba': 'Numba',
-        'jax': 'JAX',
-        'cupy': 'CuPy',
-        'sklearn': 'scikit-learn',
-        'networkx': 'NetworkX',
-        'matplotlib': 'Matplotlib',
-    }
-    
-    # Check for dependencies with CUDA support
-    cuda_packages = ['cupy', 'jax', 'numba']
-    
     console.print("\n[bold cyan]High-Performance Computing Python Dependencies Check[/bold cyan]\n")
-    
-    # Get CUDA information
-    cuda_info = check_cuda_support()
-    
-    # Check each package
-    available_packages = []
-    missing_packages = []
-    
-    for package_name, display_name in packages.items():
-        version_str = get_package_version(package_name)
-        if version_str is None:
-            missing_packages.append(display_name)
-        else:
-            cuda_support = cuda_info.get(package_name, 'N/A') if package_name in cuda_packages else '-'
-            available_packages.append({
-                'Package': display_name,
-                'Version': version_str,
-                'CUDA Support': cuda_support
-            })
-    
+
+    available_packages = [r for r in results.values() if r['version'] is not None]
+    missing_packages = [r['name'] for r in results.values() if r['version'] is None]
+
     # Create and display table of available packages
     if available_packages:
-        table = Table(title="✓ Installed Packages", show_header=True, header_style="bold magenta")
+        title = "✓ Installed Packages" + (" (cached)" if cached else "")
+        table = Table(title=title, show_header=True, header_style="bold magenta")
         table.add_column("Package", style="cyan")
         table.add_column("Version", style="green")
         table.add_column("CUDA Support", style="yellow")
-        
+        table.add_column("Probe (s)", justify="right")
+        if cached:
+            table.add_column("Cached probe (s)", justify="right")
+
         for pkg in available_packages:
-            cuda_style = "green" if pkg['CUDA Support'] == 'Yes' else "yellow" if pkg['CUDA Support'] == 'CPU only' else "dim"
+            cuda_style = "green" if pkg['cuda'] == 'Yes' else "yellow" if pkg['cuda'] == 'CPU only' else "dim"
+            times = [f"{pkg['probe_time']:.3f}"]
+            if cached:
+                times.append(f"{pkg['cached_probe_time']:.3f}")
             table.add_row(
-                pkg['Package'],
-                pkg['Version'],
-                pkg['CUDA Support'],
-                style=cuda_style if pkg['CUDA Support'] != '-' else None
+                pkg['name'],
+                pkg['version'],
+                pkg['cuda'],
+                *times,
+                style=cuda_style if pkg['cuda'] != '-' else None
             )
-        
+
         console.print(table)
-    
+
     # Display missing packages
     if missing_packages:
         console.print(f"\n[bold red]✗ Missing Packages ({len(missing_packages)})[/bold red]")
         for pkg in missing_packages:
             console.print(f"  [red]•[/red] {pkg}")
-    
+
     # Summary
-    total = len(available_packages) + len(missing_packages)
+    total = len(results)
     installed = len(available_packages)
     summary_text = f"[bold]Summary:[/bold] [green]{installed}[/green]/[cyan]{total}[/cyan] packages installed"
     console.print(f"\n{summary_text}\n")
-    
+
     # GPU/CUDA Status Panel
     cuda_status = []
-    for pkg_name in cuda_packages:
-        status = cuda_info.get(pkg_name, 'N/A')
-        display_name = packages.get(pkg_name, pkg_name)
+    for pkg_name in CUDA_PROBES:
+        status = results[pkg_name]['cuda']
+        display_name = results[pkg_name]['name']
         status_color = "green" if status == 'Yes' else "yellow" if status == 'CPU only' else "red"
         cuda_status.append(f"  [cyan]{display_name:12}[/cyan]: [{status_color}]{status}[/{status_color}]")
-    
+
     panel = Panel(
         "\n".join(cuda_status),
         title="[bold]GPU/CUDA Status[/bold]",
@@ -141,9 +228,36 @@ def main():
         expand=False
     )
     console.print(panel)
-    
+
+
+def main():
+    """Main function to check and display dependency information."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as JSON')
+    parser.add_argument('--timeout', type=float, default=30.0,
+                        help='seconds before a CUDA probe is abandoned (default 30)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='run the CUDA probes even if cached results exist')
+    args = parser.parse_args()
+
+    results, cached = check_packages(args.timeout, use_cache=not args.no_cache)
+    missing = [name for name, r in results.items() if r['version'] is None]
+
+    if args.json:
+        print(json.dumps({
+            'python': sys.version.split()[0],
+            'executable': sys.executable,
+            'cached': cached,
+            'packages': results,
+            'missing': missing,
+        }, indent=2))
+    else:
+        print_report(results, cached)
+
     # Return exit code
-    return 0 if not missing_packages else 1
+    return 0 if not missing else 1
+
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Adaptive Dormand-Prince 5(4) integrator for the oscillator models.
+
+`euler_step` and `runge_kutta_step` in `km_cupy.ipynb` use a fixed `dt`, which
+has to resolve the fastest transient for the whole run. `dopri5` uses the
+embedded 4th order solution to estimate the local error, adapts the step
+size to `rtol`/`atol`, and samples the solution at the requested times with
+the 4th order dense output of Hairer & Wanner, so the step size is not tied
+to the output grid.
+
+The right hand side has the notebook's interface `f(x, *args)`, e.g.
+`dopri5(f_sys, x0, t_eval, args=(omega, K, SC))` or `dopri5(model.rhs, ...)`,
+and works on NumPy or CuPy arrays.
+
+Run `python adaptive.py` to compare with fixed-step RK4 at equal accuracy.
+"""
+
+from dataclasses import dataclass
+from time import perf_counter
+
+import numpy as np
+
+from kuramoto import cp, tohost
+
+# Dormand-Prince tableau
+C2, C3, C4, C5 = 1 / 5, 3 / 10, 4 / 5, 8 / 9
+A21 = 1 / 5
+A31, A32 = 3 / 40, 9 / 40
+A41, A42, A43 = 44 / 45, -56 / 15, 32 / 9
+A51, A52, A53, A54 = 19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729
+A61, A62, A63, A64, A65 = (9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176,
+                           -5103 / 18656)
+A71, A73, A74, A75, A76 = 35 / 384, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84
+# difference between the 5th and the embedded 4th order weights
+E1, E3, E4, E5, E6, E7 = (71 / 57600, -71 / 16695, 71 / 1920, -17253 / 339200,
+                          22 / 525, -1 / 40)
+# dense output
+D1, D3, D4, D5, D6, D7 = (-12715105075 / 11282082432, 87487479700 / 32700410799,
+                          -10690763975 / 1880347072, 701980252875 / 199316789632,
+                          -1453857185 / 822651844, 69997945 / 29380423)
+
+
+@dataclass
+class AdaptiveResult:
+    """Solution sampled at `t` and integration statistics."""
+    t: np.ndarray
+    x: np.ndarray          # (len(t),) + x0.shape, on the host
+    n_steps: int
+    n_rejected: int
+    n_fev: int
+    wall_time: float
+
+
+def dopri5(f, x0, t_eval, args=(), rtol=1e-6, atol=1e-8, h0=None,
+           h_max=np.inf, safety=0.9, max_steps=1_000_000):
+    """
+    Integrate dx/dt = f(x, *args) from t_eval[0] and sample at `t_eval`.
+
+    Parameters
+    ----------
+    f : callable
+        right hand side f(x, *args), autonomous as the notebook models
+    x0 : array
+        initial state (NumPy or CuPy), for an ensemble (nn, ns) a single
+        step size is used for all members
+    t_eval : array
+        increasing output times, t_eval[0] is the initial time
+    rtol, atol : float
+        relative and absolute tolerance of the local error
+    h0 : float, optional
+        initial step, estimated from f(x0) if not given
+    h_max : float
+        largest step size
+
+    Returns
+    -------
+    AdaptiveResult
+    """
+    xp = cp.get_array_module(x0) if cp is not None else np
+    t_eval = np.asarray(t_eval, dtype=float)
+    t, t_end = t_eval[0], t_eval[-1]
+    x = xp.array(x0, dtype=float, copy=True)
+    out = xp.empty((len(t_eval),) + x.shape)
+    out[0] = x
+    i_out = 1
+
+    def err_norm(e, x, x_new):
+        scale = atol + rtol * xp.maximum(xp.abs(x), xp.abs(x_new))
+        return float(xp.sqrt(xp.mean((e / scale) ** 2)))
+
+    t0 = perf_counter()
+    k1 = f(x, *args)
+    n_fev = 1
+    if h0 is None:
+        d0 = float(xp.sqrt(xp.mean(x ** 2)))
+        d1 = float(xp.sqrt(xp.mean(k1 ** 2)))
+        h0 = 0.01 * d0 / d1 if (d0 > 1e-5 and d1 > 1e-5) else 1e-6
+    h = min(h0, h_max, t_end - t)
+
+    n_steps = n_rejected = 0
+    while i_out < len(t_eval):
+        if n_steps + n_rejected >= max_steps:
+            raise RuntimeError(f"dopri5: more than {max_steps} steps")
+        h = min(h, t_end - t)
+
+        k2 = f(x + h * A21 * k1, *args)
+        k3 = f(x + h * (A31 * k1 + A32 * k2), *args)
+        k4 = f(x + h * (A41 * k1 + A42 * k2 + A43 * k3), *args)
+        k5 = f(x + h * (A51 * k1 + A52 * k2 + A53 * k3 + A54 * k4), *args)
+        k6 = f(x + h * (A61 * k1 + A62 * k2 + A63 * k3 + A64 * k4 + A65 * k5),
+               *args)
+        x_new = x + h * (A71 * k1 + A73 * k3 + A74 * k4 + A75 * k5 + A76 * k6)
+        k7 = f(x_new, *args)
+        n_fev += 6
+
+        e = h * (E1 * k1 + E3 * k3 + E4 * k4 + E5 * k5 + E6 * k6 + E7 * k7)
+        err = err_norm(e, x, x_new)
+
+        if err <= 1.0:
+            t_new = t + h
+            # dense output on [t, t_new] for the samples inside the step
+            if i_out < len(t_eval) and t_eval[i_out] <= t_new:
+                ydiff = x_new - x
+                bspl = h * k1 - ydiff
+                r4 = ydiff - h * k7 - bspl
+                r5 = h * (D1 * k1 + D3 * k3 + D4 * k4 + D5 * k5 + D6 * k6
+                          + D7 * k7)
+                while i_out < len(t_eval) and t_eval[i_out] <= t_new:
+                    th = (t_eval[i_out] - t) / h
+                    th1 = 1.0 - th
+                    out[i_out] = x + th * (ydiff + th1 * (
+                        bspl + th * (r4 + th1 * r5)))
+                    i_out += 1
+            t, x, k1 = t_new, x_new, k7     # first same as last
+            n_steps += 1
+            fac = safety * (err if err > 0 else 1e-10) ** -0.2
+            h = min(h * min(10.0, fac), h_max)
+        else:
+            n_rejected += 1
+            h *= max(0.2, safety * err ** -0.2)
+
+    return AdaptiveResult(t=t_eval, x=tohost(out), n_steps=n_steps,
+                          n_rejected=n_rejected, n_fev=n_fev,
+                          wall_time=perf_counter() - t0)
+
+
+def rk4_fixed(f, x0, t_eval, dt, args=()):
+    """Fixed-step RK4 sampled at `t_eval` (multiples of dt), for comparison."""
+    x = np.array(x0, dtype=float, copy=True)
+    out = np.empty((len(t_eval),) + x.shape)
+    out[0] = x
+    t0 = perf_counter()
+    n_steps = 0
+    for i in range(1, len(t_eval)):
+        n = int(round((t_eval[i] - t_eval[i - 1]) / dt))
+        for _ in range(n):
+            k1 = f(x, *args)
+            k2 = f(x + dt * k1 / 2, *args)
+            k3 = f(x + dt * k2 / 2, *args)
+            k4 = f(x + dt * k3, *args)
+            x = x + dt * (k1 + 2 * k2 + 2 * k3 + k4) / 6
+        n_steps += n
+        out[i] = x
+    return out, n_steps, perf_counter() - t0
+
+
+if __name__ == '__main__':
+    from kuramoto import Kuramoto
+
+    rng = np.random.default_rng(2)
+    nn, ns = 100, 4
+    SC = (rng.random((nn, nn)) < 0.5).astype(float)
+    omega = rng.normal(0, 1.0, size=nn)
+    K = np.linspace(0.02, 0.1, ns)
+    x0 = rng.uniform(0, 2 * np.pi, size=(nn, ns))
+    model = Kuramoto(SC, omega, K, ns=ns)
+    f = lambda x: model.rhs(x).copy()
+
+    t_eval = np.arange(0.0, 200.0 + 1e-9, 1.0)
+    ref = dopri5(f, x0, t_eval, rtol=1e-12, atol=1e-12)
+
+    print(f"Kuramoto nn={nn}, ns={ns}, T={t_eval[-1]:.0f}")
+    print(f"  {'method':<24} {'steps':>7} {'f evals':>8} {'max error':>10} "
+          f"{'wall (s)':>9}")
+    for rtol in [1e-4, 1e-6, 1e-8]:
+        res = dopri5(f, x0, t_eval, rtol=rtol, atol=rtol * 1e-2)
+        err = np.abs(res.x - ref.x).max()
+        print(f"  {'dopri5 rtol=%.0e' % rtol:<24} {res.n_steps:>7} "
+              f"{res.n_fev:>8} {err:>10.2e} {res.wall_time:>9.3f}")
+
+        # largest fixed step (1 / 2^k) with at least the same accuracy
+        dt = 0.5
+        while True:
+            x_rk4, n_rk4, t_rk4 = rk4_fixed(f, x0, t_eval, dt)
+            err_rk4 = np.abs(x_rk4 - ref.x).max()
+            if err_rk4 <= err or dt < 1e-3:
+                break
+            dt /= 2
+        print(f"  {'rk4 dt=%g' % dt:<24} {n_rk4:>7} {4 * n_rk4:>8} "
+              f"{err_rk4:>10.2e} {t_rk4:>9.3f}")
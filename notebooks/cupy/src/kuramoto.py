@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Kuramoto model integrator for NumPy (CPU) and CuPy (GPU).
+
+`f_sys` in `km_cupy.ipynb` evaluates the coupling as
+
+    sum_j SC_ij sin(x_j - x_i)
+
+through `SC * xp.sin(x - x[:, None])`, which builds two (nn, nn, ns)
+temporaries on every call. With sin(a - b) = sin a cos b - cos a sin b the
+same sum is
+
+    cos(x_i) (SC @ sin x)_i - sin(x_i) (SC @ cos x)_i
+
+i.e. two matrix products and O(nn * ns) memory. `Kuramoto` evaluates the right
+hand side in that form and keeps all RK4 stage arrays preallocated, so a step
+does not allocate.
+
+Run `python kuramoto.py` to validate against the notebook's `f_sys` and to
+benchmark both on the CPU.
+"""
+
+import sys
+from bisect import bisect_right
+from dataclasses import dataclass
+from time import perf_counter
+
+import numpy as np
+
+try:
+    import cupy as cp
+except ImportError:
+    cp = None
+
+
+def get_module(engine="gpu"):
+    '''
+    to switch engine between gpu and cpu
+    '''
+    if engine == "gpu":
+        if cp is None:
+            raise ImportError("CuPy is required for engine='gpu'")
+        return cp
+    else:
+        return np
+
+
+def tohost(x):
+    '''
+    move data to cpu
+    '''
+    return cp.asnumpy(x) if cp is not None else np.asarray(x)
+
+
+def f_sys(x, omega, K, SC):
+    """Reference right hand side from `km_cupy.ipynb` (SC of shape (nn, nn, 1))."""
+    xp = cp.get_array_module(x) if cp is not None else np
+    return omega + K * xp.sum(SC * xp.sin(x - x[:, None]), axis=1)
+
+
+def calc_r(theta):
+    """
+    Order parameter of a stored trajectory theta (nt, nn), array (nt,).
+
+    Same result as the notebook's per-step loop, in one vectorized reduction.
+    """
+    xp = cp.get_array_module(theta) if cp is not None else np
+    return xp.hypot(xp.sin(theta).mean(axis=1), xp.cos(theta).mean(axis=1))
+
+
+class RunningStats:
+    """Welford accumulator of the mean and variance of a sequence of arrays."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self._m2 = None
+
+    def update(self, value):
+        self.count += 1
+        if self.mean is None:
+            self.mean = value * 1.0
+            self._m2 = value * 0.0
+            return
+        delta = value - self.mean
+        self.mean = self.mean + delta / self.count
+        self._m2 = self._m2 + delta * (value - self.mean)
+
+    @property
+    def var(self):
+        """Population variance of the values seen so far."""
+        if self.count == 0:
+            return None
+        return self._m2 / self.count
+
+    def state(self):
+        """Host arrays to checkpoint the accumulator."""
+        if self.count == 0:
+            return {"stats_count": 0}
+        return {"stats_count": self.count, "stats_mean": tohost(self.mean),
+                "stats_m2": tohost(self._m2)}
+
+    def restore(self, state, xp=np):
+        self.count = int(state["stats_count"])
+        if self.count:
+            self.mean = xp.asarray(state["stats_mean"])
+            self._m2 = xp.asarray(state["stats_m2"])
+
+
+@dataclass
+class RunResult:
+    """
+    Summaries of a run kept instead of the full trajectory.
+
+    x : final state
+    t, r : sample times and r(t), array (n_samples,) or (n_samples, ns)
+    r_mean, r_var : time average and variance of r over the samples
+    t_snapshots, snapshots : decimated states, array (n_snap,) + x.shape
+    """
+    x: object
+    t: np.ndarray
+    r: np.ndarray
+    r_mean: np.ndarray
+    r_var: np.ndarray
+    t_snapshots: np.ndarray
+    snapshots: np.ndarray
+
+
+class Kuramoto:
+    """
+    Kuramoto oscillators x (nn,) or (nn, ns) coupled through SC.
+
+    dx_i/dt = omega_i + K sum_j SC_ij sin(x_j - x_i)
+
+    Parameters
+    ----------
+    SC : array (nn, nn) or (nn, nn, 1)
+        structural connectivity, the notebook's trailing axis is accepted
+    omega : array (nn,) or (nn, ns)
+        natural frequencies
+    K : float or array (ns,)
+        coupling, one value per simulation along the last axis of x
+    ns : int, optional
+        number of simulations; None integrates a single state of shape (nn,)
+    engine : str
+        "cpu" (NumPy) or "gpu" (CuPy)
+    dtype : numpy.dtype
+        floating point type of the state and work buffers
+    """
+
+    # arrays of the state's shape held by an instance (work buffers and
+    # omega), used to size batches against a memory budget
+    n_buffers = 10
+
+    def __init__(self, SC, omega, K, ns=None, engine="cpu", dtype=np.float64):
+        xp = get_module(engine)
+        self.xp = xp
+        self.dtype = dtype
+
+        self.nn = self._set_coupling(SC)
+        self.ns = ns
+        self.shape = (self.nn,) if ns is None else (self.nn, ns)
+
+        omega = xp.asarray(omega, dtype=dtype)
+        if ns is not None and omega.ndim == 1:
+            omega = omega[:, None]
+        self.omega = omega
+        self.K = xp.asarray(K, dtype=dtype)
+
+        # work buffers: sin/cos of the state, the two matrix products and the
+        # RK4 stages; allocated once and reused by every step
+        buf = lambda: xp.empty(self.shape, dtype=dtype)
+        self._sin, self._cos = buf(), buf()
+        self._gs, self._gc = buf(), buf()
+        self._k1, self._k2, self._k3, self._k4 = buf(), buf(), buf(), buf()
+        self._xt = buf()
+
+    def _set_coupling(self, SC):
+        """Store the connectivity and return the number of nodes."""
+        SC = self.xp.asarray(SC, dtype=self.dtype)
+        if SC.ndim == 3:
+            SC = SC[:, :, 0]
+        self.SC = self.xp.ascontiguousarray(SC)
+        return self.SC.shape[0]
+
+    def rhs(self, x, out=None):
+        """Evaluate dx/dt at `x` into `out` without nn x nn temporaries."""
+        xp = self.xp
+        if out is None:
+            out = xp.empty(self.shape, dtype=self.dtype)
+        s, c, gs, gc = self._sin, self._cos, self._gs, self._gc
+        xp.sin(x, out=s)
+        xp.cos(x, out=c)
+        xp.matmul(self.SC, s, out=gs)
+        xp.matmul(self.SC, c, out=gc)
+        xp.multiply(c, gs, out=out)
+        gc *= s
+        out -= gc
+        out *= self.K
+        out += self.omega
+        return out
+
+    def euler_step(self, x, dt):
+        """Advance `x` in place by one Euler step."""
+        k1 = self.rhs(x, self._k1)
+        k1 *= dt
+        x += k1
+        return x
+
+    def runge_kutta_step(self, x, dt):
+        """Advance `x` in place by one classical RK4 step."""
+        xp = self.xp
+        k1, k2, k3, k4, xt = self._k1, self._k2, self._k3, self._k4, self._xt
+
+        self.rhs(x, k1)
+        xp.multiply(k1, 0.5 * dt, out=xt)
+        xt += x
+        self.rhs(xt, k2)
+        xp.multiply(k2, 0.5 * dt, out=xt)
+        xt += x
+        self.rhs(xt, k3)
+        xp.multiply(k3, dt, out=xt)
+        xt += x
+        self.rhs(xt, k4)
+
+        # x += dt/6 * (k1 + 2 k2 + 2 k3 + k4)
+        k2 += k3
+        k2 *= 2.0
+        k1 += k2
+        k1 += k4
+        k1 *= dt / 6.0
+        x += k1
+        return x
+
+    def order_parameter(self, x):
+        """
+        Order parameter r = |<exp(i x)>| over the nodes of `x`.
+
+        Returns a scalar for a single state or an array (ns,) otherwise.
+        """
+        xp = self.xp
+        s, c = self._sin, self._cos
+        xp.sin(x, out=s)
+        xp.cos(x, out=c)
+        return xp.hypot(s.mean(axis=0), c.mean(axis=0))
+
+    def run(self, x0, dt, nt, t_cut=0.0, stride=1, snapshot_stride=None,
+            keep_r=True, method="rk4", store=None, checkpoint_every=None,
+            resume=False):
+        """
+        Integrate `nt` steps from `x0`, reducing the trajectory on the fly.
+
+        Every `stride` steps after `t_cut` the order parameter is evaluated
+        and accumulated into its running mean and variance; r(t) itself is
+        kept only if `keep_r`. States are copied to the host every
+        `snapshot_stride` steps after `t_cut` (none if None). Memory is
+        O(nn * ns) plus the requested samples instead of O(nt * nn * ns).
+
+        With a `TrajectoryStore` as `store`, snapshots are appended to it
+        instead of being kept in memory, the state is checkpointed every
+        `checkpoint_every` steps, and `resume=True` continues from the
+        store's last checkpoint (x0 is then only used if there is none).
+
+        Returns
+        -------
+        RunResult
+        """
+        xp = self.xp
+        step = self.runge_kutta_step if method == "rk4" else self.euler_step
+        x = xp.array(x0, dtype=self.dtype, copy=True)
+
+        def sampled(every):
+            if not every:
+                return []
+            return [it for it in range(every, nt + 1, every) if it * dt > t_cut]
+
+        r_steps = sampled(stride)
+        snap_steps = sampled(snapshot_stride)
+        r = (xp.empty((len(r_steps),) + self.shape[1:], dtype=self.dtype)
+             if keep_r else None)
+        n_snap = len(snap_steps) if store is None else 0
+        snapshots = np.empty((n_snap,) + self.shape, dtype=self.dtype)
+        stats = RunningStats()
+
+        start = 0
+        ckpt = store.load_checkpoint() if (store is not None and resume) else None
+        if ckpt is not None:
+            start = int(ckpt["step"])
+            x[...] = xp.asarray(ckpt["x"])
+            stats.restore(ckpt, xp)
+            if keep_r:
+                r[:len(ckpt["r"])] = xp.asarray(ckpt["r"])
+        ir = bisect_right(r_steps, start)
+        isnap = bisect_right(snap_steps, start)
+
+        for it in range(start + 1, nt + 1):
+            step(x, dt)
+            if ir < len(r_steps) and it == r_steps[ir]:
+                rt = self.order_parameter(x)
+                stats.update(rt)
+                if keep_r:
+                    r[ir] = rt
+                ir += 1
+            if isnap < len(snap_steps) and it == snap_steps[isnap]:
+                if store is None:
+                    snapshots[isnap] = tohost(x)
+                else:
+                    store.append(tohost(x), it * dt)
+                isnap += 1
+            if store is not None and checkpoint_every and \
+                    it % checkpoint_every == 0:
+                r_done = tohost(r[:ir]) if keep_r else np.empty(0)
+                store.checkpoint(it, x=tohost(x), r=r_done, **stats.state())
+
+        return RunResult(
+            x=x,
+            t=np.array(r_steps) * dt,
+            r=tohost(r) if keep_r else None,
+            r_mean=tohost(stats.mean) if stats.count else None,
+            r_var=tohost(stats.var) if stats.count else None,
+            t_snapshots=np.array(snap_steps) * dt,
+            snapshots=snapshots,
+        )
+
+    def integrate(self, x0, dt, nt, method="rk4"):
+        """
+        Integrate `nt` steps from `x0` and return the final state.
+
+        `x0` is copied, the returned array is owned by the caller.
+        """
+        step = self.runge_kutta_step if method == "rk4" else self.euler_step
+        x = self.xp.array(x0, dtype=self.dtype, copy=True)
+        for _ in range(nt):
+            step(x, dt)
+        return x
+
+
+def _time_call(func, repeat):
+    func()
+    t0 = perf_counter()
+    for _ in range(repeat):
+        func()
+    return (perf_counter() - t0) / repeat
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(2)
+
+    # validation against the notebook formulation
+    nn, ns = 100, 8
+    SC = (rng.random((nn, nn)) < 0.5).astype(int)
+    x = rng.uniform(0, 2 * np.pi, size=(nn, ns))
+    omega = np.tile(rng.normal(0, 1.0, size=(nn, 1)), (1, ns))
+    K = np.linspace(0, 1.0, ns)
+    model = Kuramoto(SC, omega, K, ns=ns)
+    ref = f_sys(x, omega, K, SC.reshape(SC.shape + (1,)))
+    err = np.abs(model.rhs(x) - ref).max()
+    print(f"max |rhs - f_sys| = {err:.3e}")
+    if not np.allclose(model.rhs(x), ref):
+        print(f'{sys.argv[0]}: ERROR: could not validate rhs', file=sys.stderr)
+        sys.exit(1)
+
+    dt = 0.05
+    x_ref = x.copy()
+    for _ in range(10):
+        k1 = f_sys(x_ref, omega, K, SC[:, :, None])
+        k2 = f_sys(x_ref + dt * k1 / 2, omega, K, SC[:, :, None])
+        k3 = f_sys(x_ref + dt * k2 / 2, omega, K, SC[:, :, None])
+        k4 = f_sys(x_ref + dt * k3, omega, K, SC[:, :, None])
+        x_ref = x_ref + dt * (k1 + 2 * k2 + 2 * k3 + k4) / 6
+    x_new = model.integrate(x, dt, 10)
+    print(f"max |rk4 - notebook rk4| after 10 steps = "
+          f"{np.abs(x_new - x_ref).max():.3e}")
+
+    # on-the-fly order parameter against the stored trajectory
+    res = model.run(x, dt, 200, stride=1, snapshot_stride=1)
+    r_stored = np.stack([calc_r(res.snapshots[:, :, i]) for i in range(ns)], 1)
+    print(f"max |online r - calc_r(trajectory)| = "
+          f"{np.abs(res.r - r_stored).max():.3e}")
+    assert np.allclose(res.r_mean, r_stored.mean(axis=0))
+    assert np.allclose(res.r_var, r_stored.var(axis=0))
+
+    # CPU benchmark, one RK4 step
+    ns = 4
+    print(f"\nRK4 step time on CPU, ns={ns}")
+    print(f"{'nn':>8} {'f_sys (ms)':>12} {'Kuramoto (ms)':>14} {'speedup':>8}")
+    for nn in [100, 300, 1000, 3000, 10_000]:
+        SC = (rng.random((nn, nn)) < 0.1).astype(np.float64)
+        x = rng.uniform(0, 2 * np.pi, size=(nn, ns))
+        omega = rng.normal(0, 1.0, size=(nn, 1)) * np.ones((1, ns))
+        K = np.linspace(0, 1.0, ns)
+        model = Kuramoto(SC, omega, K, ns=ns)
+        repeat = max(1, 200_000 // (nn * nn // 100 + 1))
+        t_new = _time_call(lambda: model.runge_kutta_step(x, dt), repeat)
+
+        # the dense reference needs two (nn, nn, ns) temporaries
+        if nn * nn * ns <= 4e7:
+            SC3 = SC[:, :, None]
+
+            def rk4_ref():
+                k1 = f_sys(x, omega, K, SC3)
+                k2 = f_sys(x + dt * k1 / 2, omega, K, SC3)
+                k3 = f_sys(x + dt * k2 / 2, omega, K, SC3)
+                k4 = f_sys(x + dt * k3, omega, K, SC3)
+                return x + dt * (k1 + 2 * k2 + 2 * k3 + k4) / 6
+
+            t_ref = _time_call(rk4_ref, max(1, repeat // 10))
+            print(f"{nn:>8} {1e3 * t_ref:>12.3f} {1e3 * t_new:>14.3f} "
+                  f"{t_ref / t_new:>7.1f}x")
+        else:
+            print(f"{nn:>8} {'(skipped)':>12} {1e3 * t_new:>14.3f} {'-':>8}")
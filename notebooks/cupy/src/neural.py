@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Allocation-free version of `run_neural_simulation` from `note.ipynb`.
+
+The notebook loop creates several fresh (nn, ns) arrays per step (`SC @ x`,
+`x**3`, `x - x**3/3 + y`, `eta - x + 1e-2*gx`, ...) and appends snapshots to a
+list. `NeuralSimulation` keeps two work buffers, computes the coupling with
+`matmul(..., out=)` and updates x and y either with in-place ufuncs (NumPy or
+CuPy) or with one fused Numba kernel parallel over blocks of samples (CPU).
+Snapshots are written into a preallocated (n_snap, nn, ns) array.
+
+Run `python neural.py` to compare the variants on the CPU.
+"""
+
+import math
+import tracemalloc
+from dataclasses import dataclass
+from time import perf_counter
+
+import numpy as np
+
+from kuramoto import cp, get_module, tohost
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+@dataclass
+class SimulationResult:
+    """Snapshots of x and timing of a run."""
+    xs: np.ndarray          # (n_snap, nn, ns)
+    wall_time: float
+    nt: int
+
+    @property
+    def steps_per_sec(self):
+        return self.nt / self.wall_time
+
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _fused_update(x, y, eta, gx, tau, rtau, third, coupling, dt, block):
+        """x, y += dt * (dx, dy) for every sample; gx = SC @ x on entry.
+
+        The scalars have the dtype of the arrays, Python literals would
+        promote a float32 update to float64.
+        """
+        nn, ns = x.shape
+        nblocks = (ns + block - 1) // block
+        for b in numba.prange(nblocks):
+            j0 = b * block
+            j1 = min(j0 + block, ns)
+            for i in range(nn):
+                for j in range(j0, j1):
+                    xi = x[i, j]
+                    dx = tau * (xi - xi * xi * xi * third + y[i, j])
+                    dy = rtau * (eta[i, j] - xi + coupling * gx[i, j])
+                    x[i, j] = xi + dt * dx
+                    y[i, j] += dt * dy
+
+
+class NeuralSimulation:
+    """
+    Network of FitzHugh-Nagumo type units from `note.ipynb`,
+    x, y, eta of shape (nn, ns) and coupling SC (nn, nn).
+
+    Parameters
+    ----------
+    nn, ns : int
+        number of neurons and of independent samples
+    engine : str
+        "cpu" (NumPy) or "gpu" (CuPy)
+    backend : str
+        "ufunc" for in-place array operations, "numba" for the fused kernel
+        (CPU only)
+    seed : int
+        random seed, initial conditions match the notebook for the same seed
+    dtype : numpy.dtype
+        np.float32 or np.float64
+    tau : float
+        time scale
+    block : int
+        samples per parallel work item of the numba kernel
+    """
+
+    def __init__(self, nn=68, ns=10_000, engine="cpu", backend="ufunc", seed=2,
+                 dtype=np.float32, tau=3.0, block=256):
+        if backend == "numba" and (engine != "cpu" or numba is None):
+            raise ValueError("the numba backend needs engine='cpu' and numba")
+        xp = get_module(engine)
+        self.xp = xp
+        self.backend = backend
+        self.dtype = np.dtype(dtype).type
+        self.tau = tau
+        self.rtau = 1 / tau
+        self.block = block
+
+        np.random.seed(seed)
+        if engine == "gpu":
+            cp.random.seed(seed)
+        self.SC = xp.random.randn(nn, nn).astype(self.dtype)
+        self.x = xp.random.randn(nn, ns).astype(self.dtype)
+        self.y = xp.random.randn(nn, ns).astype(self.dtype)
+        self.eta = xp.random.randn(nn, ns).astype(self.dtype) + 1.01
+
+        self._gx = xp.empty((nn, ns), dtype=self.dtype)
+        self._tmp = xp.empty((nn, ns), dtype=self.dtype)
+
+    def step(self, dt):
+        """Advance x and y in place by one Euler step."""
+        xp = self.xp
+        x, y, gx, tmp = self.x, self.y, self._gx, self._tmp
+        xp.matmul(self.SC, x, out=gx)
+        if self.backend == "numba":
+            f = self.dtype
+            _fused_update(x, y, self.eta, gx, f(self.tau), f(self.rtau),
+                          f(1 / 3), f(1e-2), f(dt), self.block)
+            return
+
+        # tmp = dt * tau * (x - x**3/3 + y)
+        xp.multiply(x, x, out=tmp)
+        tmp *= x
+        tmp *= -1 / 3
+        tmp += x
+        tmp += y
+        tmp *= dt * self.tau
+        # gx = dt * rtau * (eta - x + 1e-2 * gx), using x before its update
+        gx *= 1e-2
+        gx += self.eta
+        gx -= x
+        gx *= dt * self.rtau
+        x += tmp
+        y += gx
+
+    def run(self, nt=20_000, dt=0.01, snapshot_every=1000, store=None,
+            checkpoint_every=None, resume=False):
+        """
+        Integrate `nt` steps, storing x every `snapshot_every` steps
+        (starting at step 0, as the notebook does).
+
+        With a `TrajectoryStore` as `store`, snapshots are appended to it
+        instead of the returned array, x and y are checkpointed every
+        `checkpoint_every` steps, and `resume=True` continues from the
+        store's last checkpoint. Only x and y are checkpointed, so a resumed
+        simulation has to be built with the same parameters and seed.
+        """
+        start = 0
+        ckpt = store.load_checkpoint() if (store is not None and resume) else None
+        if ckpt is not None:
+            start = int(ckpt["step"])
+            self.x[...] = self.xp.asarray(ckpt["x"])
+            self.y[...] = self.xp.asarray(ckpt["y"])
+
+        n_snap = math.ceil(nt / snapshot_every) if store is None else 0
+        xs = np.empty((n_snap,) + self.x.shape, dtype=self.dtype)
+        t0 = perf_counter()
+        for t in range(start, nt):
+            self.step(dt)
+            if t % snapshot_every == 0:
+                if store is None:
+                    xs[t // snapshot_every] = tohost(self.x)
+                else:
+                    store.append(tohost(self.x), t * dt)
+            if store is not None and checkpoint_every and \
+                    (t + 1) % checkpoint_every == 0:
+                store.checkpoint(t + 1, x=tohost(self.x), y=tohost(self.y))
+        if self.xp is not np:
+            self.xp.cuda.Stream.null.synchronize()
+        return SimulationResult(xs=xs, wall_time=perf_counter() - t0,
+                                nt=nt - start)
+
+
+def run_neural_simulation(use_gpu=True, nn=68, ns=10_000, nt=20_000, dt=0.01,
+                          seed=2, dtype=np.float32):
+    """Reference loop from `note.ipynb` (without the progress bar)."""
+    xp = cp if use_gpu else np
+    np.random.seed(seed)
+    if use_gpu:
+        cp.random.seed(seed)
+
+    SC = xp.random.randn(nn, nn).astype(dtype)
+    x = xp.random.randn(nn, ns).astype(dtype)
+    y = xp.random.randn(nn, ns).astype(dtype)
+    eta = xp.random.randn(nn, ns).astype(dtype) + 1.01
+    tau = 3.0
+    rtau = 1 / tau
+
+    xs = []
+    for t in range(nt):
+        gx = SC @ x
+        dx = tau * (x - x**3 / 3 + y)
+        dy = rtau * (eta - x + 1e-2 * gx)
+        x += dt * dx
+        y += dt * dy
+        if t % 1000 == 0:
+            xs.append(x.get() if use_gpu else x.copy())
+    return xs
+
+
+def _traced_peak(func):
+    """Peak traced allocation while running `func` [bytes]."""
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+if __name__ == '__main__':
+    nn, ns, nt, dt = 68, 10_000, 2000, 0.01
+
+    t0 = perf_counter()
+    xs_ref = np.asarray(run_neural_simulation(use_gpu=False, nn=nn, ns=ns,
+                                              nt=nt, dt=dt))
+    t_ref = perf_counter() - t0
+
+    print(f"CPU, nn={nn}, ns={ns}, nt={nt}, float32")
+    print(f"  {'variant':<22} {'wall (s)':>9} {'steps/s':>9} "
+          f"{'peak alloc/step (MB)':>21}")
+    ref_peak = _traced_peak(lambda: run_neural_simulation(
+        use_gpu=False, nn=nn, ns=ns, nt=1, dt=dt))
+    print(f"  {'notebook loop':<22} {t_ref:9.3f} {nt / t_ref:9.1f} "
+          f"{ref_peak / 2**20:21.2f}")
+
+    backends = ["ufunc"] + (["numba"] if numba is not None else [])
+    for backend in backends:
+        sim = NeuralSimulation(nn=nn, ns=ns, backend=backend)
+        sim.step(0.0)  # compile the kernel outside the timed region
+        sim = NeuralSimulation(nn=nn, ns=ns, backend=backend)
+        res = sim.run(nt=nt, dt=dt)
+        peak = _traced_peak(lambda: sim.step(dt))
+        err = np.abs(res.xs - xs_ref).max()
+        print(f"  {backend:<22} {res.wall_time:9.3f} {res.steps_per_sec:9.1f} "
+              f"{peak / 2**20:21.2f}   max |dx| vs notebook {err:.1e}")
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Chunked, append-only on-disk store for simulation trajectories.
+
+A store is a directory of shards plus a small `index.json`:
+
+    index.json               frame shape, dtype, list of shards
+    shard_00000.npy          (frames_per_shard,) + frame_shape, memory-mapped
+    shard_00000_t.npy        sample times of the frames
+    shard_00001.npz          a full shard after optional lossless compression
+    checkpoint.npz           last state checkpoint of the integrator
+
+Frames are copied into the memory-mapped shard by a background thread, so the
+integrator keeps computing while the data goes to disk. `checkpoint` saves the
+integrator state together with the number of frames written so far;
+reopening with mode="a" drops frames written after the last checkpoint, so a
+resumed run continues from there without duplicates. `TrajectoryReader` slices
+frames or time ranges and only touches the shards involved.
+
+Run `python trajectory_store.py` for an interrupted and resumed Kuramoto run.
+"""
+
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+INDEX = "index.json"
+CHECKPOINT = "checkpoint.npz"
+
+
+def _read_index(path):
+    with open(os.path.join(path, INDEX)) as f:
+        return json.load(f)
+
+
+def _shard_files(path, shard):
+    base = os.path.join(path, shard["name"])
+    if shard["compressed"]:
+        return [base + ".npz"]
+    return [base + ".npy", base + "_t.npy"]
+
+
+def _load_shard(path, shard, mmap_mode="r"):
+    """Return (frames, times) of a shard, memory-mapped when not compressed."""
+    base = os.path.join(path, shard["name"])
+    n = shard["count"]
+    if shard["compressed"]:
+        with np.load(base + ".npz") as f:
+            return f["x"][:n], f["t"][:n]
+    x = np.load(base + ".npy", mmap_mode=mmap_mode)
+    t = np.load(base + "_t.npy", mmap_mode=mmap_mode)
+    return x[:n], t[:n]
+
+
+class TrajectoryStore:
+    """
+    Append-only writer of frames (e.g. snapshots of x) with checkpoints.
+
+    Parameters
+    ----------
+    path : str
+        directory of the store
+    frame_shape : tuple
+        shape of one frame, needed for mode="w"
+    dtype : numpy.dtype
+        dtype of the stored frames
+    frames_per_shard : int
+        frames per shard file
+    compress : bool
+        compress full shards with `np.savez_compressed`
+    mode : str
+        "w" starts a new store (existing shards are removed), "a" reopens a
+        store and truncates it to its last checkpoint
+    queue_size : int
+        frames buffered for the writer thread before `append` blocks
+    """
+
+    def __init__(self, path, frame_shape=None, dtype=np.float32,
+                 frames_per_shard=64, compress=False, mode="w", queue_size=8):
+        self.path = path
+        if mode == "w":
+            if frame_shape is None:
+                raise ValueError("frame_shape is required for mode='w'")
+            os.makedirs(path, exist_ok=True)
+            for name in os.listdir(path):
+                if name.startswith("shard_") or name in (INDEX, CHECKPOINT):
+                    os.remove(os.path.join(path, name))
+            self.index = {
+                "frame_shape": list(frame_shape),
+                "dtype": np.dtype(dtype).str,
+                "frames_per_shard": frames_per_shard,
+                "compress": compress,
+                "shards": [],
+            }
+        elif mode == "a":
+            self.index = _read_index(path)
+            ckpt = self.load_checkpoint()
+            self._truncate(0 if ckpt is None else int(ckpt["n_frames"]))
+        else:
+            raise ValueError(f"unknown mode: {mode}")
+
+        self.frame_shape = tuple(self.index["frame_shape"])
+        self.dtype = np.dtype(self.index["dtype"])
+        self.frames_per_shard = self.index["frames_per_shard"]
+        self.compress = self.index["compress"]
+        self._write_index()
+
+        self._x = self._t = None      # memory maps of the open shard
+        self._error = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return sum(s["count"] for s in self.index["shards"])
+
+    def append(self, frame, t):
+        """Queue a copy of `frame` (sampled at time `t`) for writing."""
+        self._check_error()
+        self._queue.put((np.array(frame, dtype=self.dtype, copy=True), t))
+
+    def flush(self):
+        """Wait until all queued frames are in the memory-mapped shards."""
+        self._queue.join()
+        self._check_error()
+        if self._x is not None:
+            self._x.flush()
+            self._t.flush()
+
+    def checkpoint(self, step, **arrays):
+        """
+        Save integrator state `arrays` at `step`, consistent with the frames
+        written so far.
+        """
+        self.flush()
+        self._write_index()
+        tmp = os.path.join(self.path, "checkpoint.tmp.npz")
+        np.savez(tmp, step=step, n_frames=len(self), **arrays)
+        os.replace(tmp, os.path.join(self.path, CHECKPOINT))
+
+    def load_checkpoint(self):
+        """Return the last checkpoint as a dict of arrays, or None."""
+        fname = os.path.join(self.path, CHECKPOINT)
+        if not os.path.exists(fname):
+            return None
+        with np.load(fname) as f:
+            return {k: f[k] for k in f.files}
+
+    def close(self):
+        """Write pending frames, compress the last shard and stop the writer."""
+        if self._thread is None:
+            return
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        if self._x is not None and self.compress:
+            self._finalize_shard()
+        self._x = self._t = None
+        self._write_index()
+
+    def _check_error(self):
+        if self._error is not None:
+            raise RuntimeError("trajectory writer failed") from self._error
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._write_frame(*item)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _write_frame(self, frame, t):
+        shard = self._open_shard()
+        k = shard["count"]
+        self._x[k] = frame
+        self._t[k] = t
+        shard["count"] = k + 1
+        if shard["count"] == self.frames_per_shard:
+            self._finalize_shard()
+
+    def _open_shard(self):
+        shards = self.index["shards"]
+        if self._x is not None:
+            return shards[-1]
+
+        if shards and shards[-1]["count"] < self.frames_per_shard:
+            shard = shards[-1]
+            if shard["compressed"]:
+                # a partial shard compressed by close(): back to a memmap
+                x, t = _load_shard(self.path, shard)
+                npz = _shard_files(self.path, shard)[0]
+                shard["compressed"] = False
+                self._create_memmaps(shard)
+                self._x[:len(x)] = x
+                self._t[:len(t)] = t
+                os.remove(npz)
+            else:
+                base = os.path.join(self.path, shard["name"])
+                self._x = np.lib.format.open_memmap(base + ".npy", mode="r+")
+                self._t = np.lib.format.open_memmap(base + "_t.npy", mode="r+")
+            return shard
+
+        shard = {"name": f"shard_{len(shards):05d}", "start": len(self),
+                 "count": 0, "compressed": False}
+        shards.append(shard)
+        self._create_memmaps(shard)
+        return shard
+
+    def _create_memmaps(self, shard):
+        base = os.path.join(self.path, shard["name"])
+        self._x = np.lib.format.open_memmap(
+            base + ".npy", mode="w+", dtype=self.dtype,
+            shape=(self.frames_per_shard,) + self.frame_shape)
+        self._t = np.lib.format.open_memmap(
+            base + "_t.npy", mode="w+", dtype=np.float64,
+            shape=(self.frames_per_shard,))
+
+    def _finalize_shard(self):
+        shard = self.index["shards"][-1]
+        self._x.flush()
+        self._t.flush()
+        if self.compress:
+            n = shard["count"]
+            files = _shard_files(self.path, shard)
+            base = os.path.join(self.path, shard["name"])
+            np.savez_compressed(base + ".npz", x=self._x[:n], t=self._t[:n])
+            for fname in files:
+                os.remove(fname)
+            shard["compressed"] = True
+        self._x = self._t = None
+        self._write_index()
+
+    def _truncate(self, n_frames):
+        kept = []
+        for shard in self.index["shards"]:
+            if shard["start"] >= n_frames:
+                for fname in _shard_files(self.path, shard):
+                    if os.path.exists(fname):
+                        os.remove(fname)
+                continue
+            shard["count"] = min(shard["count"], n_frames - shard["start"])
+            kept.append(shard)
+        self.index["shards"] = kept
+
+    def _write_index(self):
+        tmp = os.path.join(self.path, INDEX + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(tmp, os.path.join(self.path, INDEX))
+
+
+class TrajectoryReader:
+    """
+    Lazy read access to a store: `reader[i]`, `reader[i:j]`, `reader.times`
+    and `reader.time_slice(t0, t1)` load only the shards they need.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        index = _read_index(path)
+        self.shards = index["shards"]
+        self.frame_shape = tuple(index["frame_shape"])
+        self.dtype = np.dtype(index["dtype"])
+        self._starts = np.array([s["start"] for s in self.shards], dtype=int)
+        self._times = None
+
+    def __len__(self):
+        return sum(s["count"] for s in self.shards)
+
+    @property
+    def times(self):
+        if self._times is None:
+            self._times = np.concatenate(
+                [_load_shard(self.path, s)[1] for s in self.shards]
+                or [np.empty(0)])
+        return self._times
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return self[key:key + 1 if key != -1 else None][0]
+        idx = np.arange(len(self))[key]
+        out = np.empty((len(idx),) + self.frame_shape, dtype=self.dtype)
+        if len(idx) == 0:
+            return out
+        which = np.searchsorted(self._starts, idx, side="right") - 1
+        for k in np.unique(which):
+            shard = self.shards[k]
+            sel = which == k
+            x, _ = _load_shard(self.path, shard)
+            out[sel] = x[idx[sel] - shard["start"]]
+        return out
+
+    def time_slice(self, t0, t1):
+        """Frames with t0 <= t <= t1, as (times, frames)."""
+        i0 = np.searchsorted(self.times, t0, side="left")
+        i1 = np.searchsorted(self.times, t1, side="right")
+        return self.times[i0:i1], self[i0:i1]
+
+
+if __name__ == '__main__':
+    import shutil
+    import tempfile
+
+    from kuramoto import Kuramoto
+
+    rng = np.random.default_rng(2)
+    nn, ns, dt, nt = 100, 8, 0.05, 400
+    SC = (rng.random((nn, nn)) < 0.5).astype(float)
+    omega = rng.normal(0, 1.0, size=nn)
+    K = np.linspace(0, 0.1, ns)
+    x0 = rng.uniform(0, 2 * np.pi, size=(nn, ns))
+    path = tempfile.mkdtemp()
+
+    # reference run, all in memory
+    ref = Kuramoto(SC, omega, K, ns=ns).run(x0, dt, nt, stride=5,
+                                             snapshot_stride=5)
+
+    # run interrupted after 250 steps (last checkpoint at 200) ...
+    store = TrajectoryStore(path, frame_shape=(nn, ns), dtype=np.float64,
+                            frames_per_shard=16, compress=True)
+    Kuramoto(SC, omega, K, ns=ns).run(x0, dt, 250, stride=5, snapshot_stride=5,
+                                      store=store, checkpoint_every=100)
+    store.flush()
+    del store
+
+    # ... and resumed from the checkpoint
+    with TrajectoryStore(path, mode="a") as store:
+        print(f"resuming at step {int(store.load_checkpoint()['step'])} "
+              f"with {len(store)} frames on disk")
+        res = Kuramoto(SC, omega, K, ns=ns).run(
+            x0, dt, nt, stride=5, snapshot_stride=5, store=store,
+            checkpoint_every=100, resume=True)
+
+    reader = TrajectoryReader(path)
+    print(f"{len(reader)} frames in {len(reader.shards)} shards")
+    assert np.allclose(reader.times, ref.t_snapshots)
+    assert np.allclose(reader[:], ref.snapshots)
+    assert np.allclose(res.r, ref.r) and np.allclose(res.r_mean, ref.r_mean)
+    t, x = reader.time_slice(5.0, 6.0)
+    print(f"time_slice(5, 6): {len(t)} frames, t = {t}")
+    shutil.rmtree(path)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Checkpointed `lax.scan` for gradients of long sequences.
+
+To differentiate `lax.scan`, as `rnn_forward` and `scan_loop` in
+`advanced_concepts.ipynb` do, JAX keeps the intermediates of every step for
+the backward pass, so gradient memory grows linearly with the sequence
+length T. `checkpoint_scan` splits the sequence into segments of S steps
+and wraps each segment in `jax.checkpoint`. The forward pass keeps only
+the carry at the segment boundaries, and the backward pass recomputes one
+segment at a time. Memory is then ~ T / S carries plus S steps of
+intermediates, minimal for S = sqrt(T), at the cost of running the forward
+pass about twice. A larger S saves fewer carries and recomputes longer
+segments. S = 1 is close to plain `lax.scan`.
+
+`rnn_forward` and `loss_fn` are the notebook's RNN with a choice of scan.
+`loss_fn` accumulates the squared error of the hidden states in the carry
+instead of stacking them, so nothing else in it grows with T.
+
+Run `python checkpoint_scan.py` to compare peak memory and step time of
+value_and_grad(loss_fn) with plain `lax.scan` for T = 10^3 to 10^6. Peak
+memory is taken from XLA's memory analysis of the compiled step. It counts
+the temporary buffers and leaves out the inputs.
+"""
+
+import math
+import sys
+from functools import partial
+from time import perf_counter
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+from jax import lax, random
+
+
+def checkpoint_scan(f, init, xs, segment_length=None, policy=None):
+    """
+    `lax.scan(f, init, xs)` that stores the carry only every `segment_length`
+    steps for reverse-mode differentiation.
+
+    Parameters
+    ----------
+    f, init, xs :
+        as for `lax.scan`; xs is a pytree of arrays with a leading time axis
+    segment_length : int, optional
+        steps per checkpointed segment S, default floor(sqrt(T))
+    policy : optional
+        `jax.checkpoint_policies` policy of what to save within a segment,
+        default nothing
+
+    Returns
+    -------
+    (carry, ys) as `lax.scan`.
+    """
+    length = jax.tree.leaves(xs)[0].shape[0]
+    if length == 0:
+        return lax.scan(f, init, xs)
+    S = segment_length or max(1, math.isqrt(length))
+    S = min(S, length)
+    n_segments, remainder = divmod(length, S)
+
+    @partial(jax.checkpoint, policy=policy, prevent_cse=False,
+             static_argnums=(2,))
+    def segment(carry, start, size):
+        # slices of xs, not a reshaped copy of it
+        xs_segment = jax.tree.map(
+            lambda x: lax.dynamic_slice_in_dim(x, start, size), xs)
+        return lax.scan(f, carry, xs_segment)
+
+    carry, ys = lax.scan(lambda c, start: segment(c, start, S), init,
+                         jnp.arange(n_segments) * S)
+    ys = jax.tree.map(lambda y: y.reshape((n_segments * S,) + y.shape[2:]),
+                      ys)
+    if remainder:
+        carry, ys_tail = segment(carry, n_segments * S, remainder)
+        ys = jax.tree.map(lambda a, b: jnp.concatenate([a, b]), ys, ys_tail)
+    return carry, ys
+
+
+def _scan(checkpoint, segment_length):
+    if checkpoint:
+        return partial(checkpoint_scan, segment_length=segment_length)
+    return lax.scan
+
+
+def rnn_cell(carry, x, W_hh, W_xh, b):
+    """Single RNN step."""
+    h = carry
+    h_new = jnp.tanh(jnp.dot(W_hh, h) + jnp.dot(W_xh, x) + b)
+    return h_new, h_new
+
+
+@partial(jax.jit, static_argnames=("checkpoint", "segment_length"))
+def rnn_forward(params, h0, xs, checkpoint=True, segment_length=None):
+    """Hidden states (time_steps, hidden_dim) of the RNN for the input
+    sequence xs (time_steps, input_dim)."""
+    def body(carry, x):
+        return rnn_cell(carry, x, params['W_hh'], params['W_xh'], params['b'])
+
+    _, outputs = _scan(checkpoint, segment_length)(body, h0, xs)
+    return outputs
+
+
+def loss_fn(params, h0, xs, targets, checkpoint=True, segment_length=None):
+    """Mean over time of the squared error between the hidden states and
+    targets (time_steps, hidden_dim)."""
+    def body(carry, x_target):
+        h, total = carry
+        x, target = x_target
+        h, _ = rnn_cell(h, x, params['W_hh'], params['W_xh'], params['b'])
+        return (h, total + jnp.sum((h - target) ** 2)), None
+
+    (_, total), _ = _scan(checkpoint, segment_length)(
+        body, (h0, jnp.zeros((), h0.dtype)), (xs, targets))
+    return total / xs.shape[0]
+
+
+def init_params(key, hidden_dim, input_dim):
+    subkeys = random.split(key, 2)
+    return {
+        'W_hh': random.normal(subkeys[0], (hidden_dim, hidden_dim)) * 0.1,
+        'W_xh': random.normal(subkeys[1], (hidden_dim, input_dim)) * 0.1,
+        'b': jnp.zeros(hidden_dim)
+    }
+
+
+def grad_step_stats(params, h0, xs, targets, checkpoint, segment_length=None,
+                    repeat=3):
+    """Temporary memory [bytes] of the compiled value_and_grad(loss_fn) and
+    its best time [s]."""
+    step = jax.jit(jax.value_and_grad(loss_fn),
+                   static_argnames=("checkpoint", "segment_length"))
+    kwargs = dict(checkpoint=checkpoint, segment_length=segment_length)
+    compiled = step.lower(params, h0, xs, targets, **kwargs).compile()
+    memory = compiled.memory_analysis().temp_size_in_bytes
+    jax.block_until_ready(compiled(params, h0, xs, targets))
+    best = np.inf
+    for _ in range(repeat):
+        start = perf_counter()
+        jax.block_until_ready(compiled(params, h0, xs, targets))
+        best = min(best, perf_counter() - start)
+    return memory, best
+
+
+if __name__ == '__main__':
+    hidden_dim, input_dim = 32, 8
+    key, k_params, k_x, k_t = random.split(random.PRNGKey(0), 4)
+    params = init_params(k_params, hidden_dim, input_dim)
+    h0 = jnp.zeros(hidden_dim)
+
+    def sequence(T):
+        return (random.normal(k_x, (T, input_dim)),
+                random.normal(k_t, (T, hidden_dim)))
+
+    # validation, T not a multiple of the segment length, and T = 0
+    value_grad = jax.value_and_grad(loss_fn)
+    close = partial(jnp.allclose, rtol=1e-5, atol=1e-6, equal_nan=True)
+    for T in [1009, 0]:
+        xs, targets = sequence(T)
+        plain = value_grad(params, h0, xs, targets, checkpoint=False)
+        for S in [None, 1, 7, 2000]:
+            ck = value_grad(params, h0, xs, targets, segment_length=S)
+            if not all(jax.tree.leaves(jax.tree.map(close, plain, ck))):
+                print(f'{sys.argv[0]}: ERROR: checkpointed gradient differs '
+                      f'for T = {T}, segment length {S}', file=sys.stderr)
+                sys.exit(1)
+        if not jnp.allclose(rnn_forward(params, h0, xs),
+                            rnn_forward(params, h0, xs, checkpoint=False)):
+            print(f'{sys.argv[0]}: ERROR: checkpointed rnn_forward differs '
+                  f'for T = {T}', file=sys.stderr)
+            sys.exit(1)
+
+    print(f"value_and_grad(loss_fn), hidden {hidden_dim}, input {input_dim}")
+    print(f"{'T':>8} {'scan [MB]':>10} {'[ms]':>9} {'sqrt(T) [MB]':>13} "
+          f"{'[ms]':>9} {'memory':>7}")
+    for T in [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]:
+        xs, targets = sequence(T)
+        m_plain, t_plain = grad_step_stats(params, h0, xs, targets, False)
+        m_ck, t_ck = grad_step_stats(params, h0, xs, targets, True)
+        print(f"{T:>8} {m_plain / 1e6:>10.2f} {1e3 * t_plain:>9.1f} "
+              f"{m_ck / 1e6:>13.3f} {1e3 * t_ck:>9.1f} "
+              f"{m_plain / m_ck:>6.0f}x")
+
+    T = 10 ** 5
+    xs, targets = sequence(T)
+    print(f"\nsegment length S, T = {T}")
+    print(f"{'S':>8} {'[MB]':>10} {'[ms]':>9}")
+    for S in [1, 10, 100, math.isqrt(T), 1000, 10000, T]:
+        memory, t = grad_step_stats(params, h0, xs, targets, True, S)
+        print(f"{S:>8} {memory / 1e6:>10.3f} {1e3 * t:>9.1f}")
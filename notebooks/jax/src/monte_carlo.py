@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Streaming Monte Carlo estimation with constant memory.
+
+`estimate_pi(key, n_samples)` in `random_generators.ipynb` draws all n
+samples at once, so its memory grows with n (24 bytes of temporaries per
+sample after XLA compilation), and a few hundred million samples fill a
+node.
+`monte_carlo` estimates the mean of any sampled quantity the same way, but
+in chunks. The key is split into independent streams, and every chunk of a
+stream gets its own key with `random.fold_in`. A jitted block evaluates the
+streams with `vmap` and a run of chunks per stream with `lax.fori_loop`,
+and keeps only mean and sum of squared deviations (M2) per stream. These
+are merged with the pairwise update of Chan et al., on the device within a
+block in the precision of the samples (at least float32), and in float64 on
+the host across blocks, where the exact sample count is kept as an integer.
+Between blocks the confidence interval is checked, and the run stops early
+once its half width is below `target_error`.
+
+Run `python monte_carlo.py` to compare with `estimate_pi` (memory, time
+and error) up to 10^9 samples and to estimate pi to a target error, or
+`python monte_carlo.py --samples 1e11` for a long run.
+"""
+
+import argparse
+import math
+import sys
+from dataclasses import dataclass
+from functools import partial
+from statistics import NormalDist
+from time import perf_counter
+
+import jax
+import jax.numpy as jnp
+from jax import lax, random
+
+
+def estimate_pi(key, n_samples):
+    """
+    Estimate π using Monte Carlo method.
+    Generate random points in [0,1]x[0,1] and count how many fall inside unit circle.
+    """
+    key_x, key_y = random.split(key)
+    x = random.uniform(key_x, shape=(n_samples,))
+    y = random.uniform(key_y, shape=(n_samples,))
+
+    # Check if points are inside unit circle
+    inside_circle = (x**2 + y**2) <= 1.0
+    pi_estimate = 4.0 * inside_circle.sum() / n_samples
+
+    return pi_estimate, x, y, inside_circle
+
+
+def pi_samples(key, n):
+    """n samples of 4 * [point in the unit circle], mean pi."""
+    x, y = random.uniform(key, (2, n))
+    return jnp.where(x * x + y * y <= 1.0, 4.0, 0.0)
+
+
+@dataclass
+class MCEstimate:
+    """Result of `monte_carlo`."""
+    mean: float
+    variance: float         # sample variance of the sampled quantity (nan
+                            # for a single sample)
+    n_samples: int
+    confidence: float
+    time: float             # [s]
+    converged: bool         # target error reached before n_samples
+
+    @property
+    def stderr(self):
+        return math.sqrt(self.variance / self.n_samples)
+
+    @property
+    def half_width(self):
+        """Half width of the confidence interval."""
+        z = NormalDist().inv_cdf(0.5 + self.confidence / 2)
+        return z * self.stderr
+
+    @property
+    def ci(self):
+        return self.mean - self.half_width, self.mean + self.half_width
+
+    @property
+    def samples_per_sec(self):
+        return self.n_samples / self.time
+
+
+def merge_stats(a, b):
+    """Merge (count, mean, M2) of two sets of samples (Chan et al.)."""
+    n_a, mean_a, m2_a = a
+    n_b, mean_b, m2_b = b
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    return (n, mean_a + delta * n_b / n,
+            m2_a + m2_b + delta * delta * n_a * n_b / n)
+
+
+@partial(jax.jit, static_argnums=(0, 1))
+def _block(sample_fn, chunk_size, stream_keys, first_chunk, n_chunks):
+    """(mean, M2) per stream of chunks first_chunk to
+    first_chunk + n_chunks - 1 of every stream, n_chunks * chunk_size
+    samples each."""
+    def stream(key):
+        # integer or half precision samples are accumulated in float32
+        shape = jax.eval_shape(lambda key: sample_fn(key, chunk_size), key)
+        dtype = jnp.promote_types(shape.dtype, jnp.float32)
+
+        def body(i, stats):
+            values = sample_fn(random.fold_in(key, first_chunk + i),
+                               chunk_size).astype(dtype)
+            mean = jnp.mean(values)
+            # the count only weights the merge, the precision of the samples
+            # is accurate enough (the exact count is kept on the host)
+            count = i.astype(dtype) * chunk_size
+            chunk = (jnp.asarray(chunk_size, dtype), mean,
+                     jnp.sum((values - mean) ** 2))
+            _, mean, m2 = merge_stats((count,) + stats, chunk)
+            return mean, m2
+
+        zero = jnp.zeros((), dtype)
+        return lax.fori_loop(0, n_chunks, body, (zero, zero))
+
+    return jax.vmap(stream)(stream_keys)
+
+
+def monte_carlo(sample_fn, key, n_samples, target_error=None,
+                confidence=0.95, chunk_size=2 ** 16, n_streams=8,
+                chunks_per_block=64):
+    """
+    Monte Carlo estimate of the mean of the values drawn by `sample_fn`.
+
+    Parameters
+    ----------
+    sample_fn : callable
+        sample_fn(key, n) -> n samples (jittable, n is static)
+    key : PRNG key
+    n_samples : int
+        maximal number of samples, rounded up to whole chunks of all streams
+    target_error : float, optional
+        stop once the half width of the confidence interval is below it
+    confidence : float
+        level of the confidence interval
+    chunk_size : int
+        samples per chunk, the memory used is ~ n_streams * chunk_size
+        samples
+    n_streams : int
+        independent random streams, evaluated together with vmap
+    chunks_per_block : int
+        chunks per stream between two checks of the target error
+
+    Returns
+    -------
+    MCEstimate
+    """
+    if n_samples <= 0:
+        raise ValueError(f"n_samples must be positive, got {n_samples}")
+    stream_keys = random.split(key, n_streams)
+    per_chunk = n_streams * chunk_size
+    total_chunks = -(-int(n_samples) // per_chunk)
+    count, mean, m2 = 0, 0.0, 0.0
+    converged = False
+    start = perf_counter()
+    for first in range(0, total_chunks, chunks_per_block):
+        n_chunks = min(chunks_per_block, total_chunks - first)
+        means, m2s = jax.device_get(_block(sample_fn, chunk_size,
+                                           stream_keys, first, n_chunks))
+        for stream_mean, stream_m2 in zip(means, m2s):
+            count, mean, m2 = merge_stats(
+                (count, mean, m2),
+                (n_chunks * chunk_size, float(stream_mean), float(stream_m2)))
+        if target_error is not None and count > 1:
+            estimate = MCEstimate(mean, m2 / (count - 1), count,
+                                  confidence, 1.0, False)
+            if estimate.half_width <= target_error:
+                converged = first + n_chunks < total_chunks
+                break
+    # a single sample has no sample variance
+    variance = m2 / (count - 1) if count > 1 else math.nan
+    return MCEstimate(mean, variance, count, confidence,
+                      perf_counter() - start, converged)
+
+
+def xla_temp_bytes(func, *args, static_argnums=()):
+    """Temporary memory of the compiled func(*args) [bytes]."""
+    compiled = jax.jit(func, static_argnums=static_argnums).lower(
+        *args).compile()
+    return compiled.memory_analysis().temp_size_in_bytes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--samples", type=float, default=None,
+                        help="only estimate pi with this many samples")
+    parser.add_argument("--target-error", type=float, default=None,
+                        help="stop the --samples run at this error")
+    args = parser.parse_args()
+    key = random.PRNGKey(42)
+
+    # validation: E[U^2] = 1/3 and Var[U^2] = 4/45 for U uniform in [0, 1]
+    square = lambda key, n: random.uniform(key, (n,)) ** 2
+    est = monte_carlo(square, key, 10 ** 7)
+    low, high = est.ci
+    if not (abs(est.mean - 1 / 3) < 5 * est.stderr
+            and abs(est.variance - 4 / 45) < 0.01 * 4 / 45
+            and low < est.mean < high and est.n_samples >= 10 ** 7):
+        print(f'{sys.argv[0]}: ERROR: estimate of E[U^2] {est.mean} '
+              f'(variance {est.variance}) is off', file=sys.stderr)
+        sys.exit(1)
+
+    def report(est):
+        low, high = est.ci
+        return (f"{est.mean:>12.8f} {abs(est.mean - math.pi):>10.2e} "
+                f"[{low:.6f}, {high:.6f}] "
+                f"{est.samples_per_sec / 1e6:>9.1f}")
+
+    if args.samples:
+        monte_carlo(pi_samples, key, 1)     # compile
+        est = monte_carlo(pi_samples, key, args.samples, args.target_error)
+        print(f"{'samples':>8} {'pi':>12} {'error':>10} {'95% CI':>22} "
+              f"{'M/s':>9}")
+        print(f"{est.n_samples:>8.1e} {report(est)}")
+        print(f"{est.time:.1f} s" + (", target error reached"
+                                     if est.converged else ""))
+        sys.exit(0)
+
+    chunk_size, n_streams = 2 ** 16, 8
+    engine_temp = xla_temp_bytes(
+        _block, pi_samples, chunk_size, random.split(key, n_streams), 0, 64,
+        static_argnums=(0, 1))
+    print("estimate_pi: all samples at once; monte_carlo: "
+          f"{n_streams} streams x {chunk_size} samples per chunk")
+    print(f"{'samples':>8} {'estimate_pi [MB]':>17} {'[M/s]':>8} "
+          f"{'error':>10} {'monte_carlo [MB]':>17} {'pi':>12} {'error':>10} "
+          f"{'95% CI':>22} {'M/s':>9}")
+    jit_estimate_pi = jax.jit(lambda key, n: estimate_pi(key, n)[0],
+                              static_argnums=1)
+    monte_carlo(pi_samples, key, 1)     # compile
+    for exp in range(6, 10):
+        n = 10 ** exp
+        if n <= 10 ** 8:
+            temp = xla_temp_bytes(jit_estimate_pi, key, n, static_argnums=1)
+            jax.block_until_ready(jit_estimate_pi(key, n))
+            t0 = perf_counter()
+            pi = float(jit_estimate_pi(key, n))
+            t = perf_counter() - t0
+            baseline = (f"{temp / 1e6:>17.1f} {n / t / 1e6:>8.1f} "
+                        f"{abs(pi - math.pi):>10.2e}")
+        else:
+            baseline = f"{'-':>17} {'-':>8} {'-':>10}"
+        est = monte_carlo(pi_samples, key, n)
+        print(f"{n:>8.0e} {baseline} {engine_temp / 1e6:>17.1f} "
+              f"{report(est)}")
+
+    target = 1e-4
+    est = monte_carlo(pi_samples, key, 1e11, target_error=target)
+    print(f"\ntarget error {target:.0e} (95% CI half width), at most 1e11 "
+          f"samples: stopped after {est.n_samples:.2e} samples, "
+          f"{est.time:.1f} s")
+    print(f"pi = {est.mean:.8f} +- {est.half_width:.1e}, "
+          f"error {abs(est.mean - math.pi):.1e}")
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Background prefetching of mini-batches for JAX training loops.
+
+`get_batches` in `random_generators.ipynb` shuffles and slices the data in
+the training loop, so the jitted update step waits for every batch to be
+assembled (and augmented, and transferred). `Prefetcher` does that work in a
+background thread and keeps up to `prefetch` batches ready on the device
+while the current step runs. For each batch the thread
+  - gathers the shuffled rows into a reused host staging buffer
+    (`np.take(..., out=)`, no allocation per batch),
+  - transfers it with `jax.device_put` followed by a jitted copy on the
+    device. On CPU, device_put of an aligned NumPy array shares its memory
+    (also with `may_alias=False` in current jaxlib), and the staging buffer
+    is overwritten by later batches. The copy completes before the buffer
+    is reused.
+  - applies an optional jittable transform, e.g. the vmapped
+    `random_augmentation` from `vectorizing.ipynb`, with its own key.
+The time the training loop waits for a batch is the stall time.
+
+Run `python prefetch.py` to compare the throughput of a training loop with
+and without prefetching.
+"""
+
+import os
+import queue
+import sys
+import threading
+from dataclasses import dataclass
+from time import perf_counter
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+from jax import lax, random
+
+
+def get_batches(key, data, batch_size, shuffle=True):
+    """
+    Generate random mini-batches from data.
+
+    Args:
+        key: PRNG key
+        data: Data array
+        batch_size: Size of each batch
+        shuffle: Whether to shuffle data
+    """
+    n = len(data)
+    indices = jnp.arange(n)
+
+    if shuffle:
+        indices = random.permutation(key, indices)
+
+    # Generate batches
+    batches = []
+    for i in range(0, n, batch_size):
+        batch_indices = indices[i:i+batch_size]
+        batches.append(data[batch_indices])
+
+    return batches
+
+
+@dataclass
+class PrefetchStats:
+    """Timing of a prefetched run."""
+    batches: int = 0
+    stall_time: float = 0.0      # training loop waiting for batches [s]
+    produce_time: float = 0.0    # gather + transfer + transform [s]
+
+
+_DONE = object()
+
+_device_copy = jax.jit(lambda batch: jax.tree.map(jnp.copy, batch))
+
+
+class Prefetcher:
+    """
+    Iterator over the mini-batches of `n_epochs` shuffled passes over `data`,
+    prepared `prefetch` batches ahead in a background thread.
+
+    Parameters
+    ----------
+    key : PRNG key
+        shuffles each epoch and keys the transform
+    data : array or tuple of arrays with the same leading dimension
+        host (NumPy) data, batches are tuples if data is
+    batch_size : int
+    n_epochs : int
+    prefetch : int
+        number of batches prepared ahead, on the device
+    transform : callable, optional
+        transform(key, batch) -> batch applied on the device, e.g. an
+        augmentation (jit it)
+    shuffle : bool
+    device : jax.Device, optional
+        default the first device
+
+    Use it as a context manager, or call `close` when stopping early.
+    """
+
+    def __init__(self, key, data, batch_size, n_epochs=1, prefetch=2,
+                 transform=None, shuffle=True, device=None):
+        self.data = tuple(data) if isinstance(data, (tuple, list)) else data
+        self.n = len(jax.tree.leaves(self.data)[0])
+        self.batch_size = batch_size
+        self.n_epochs = n_epochs
+        self.transform = transform
+        self.shuffle = shuffle
+        self.device = device or jax.devices()[0]
+        self.key = key
+        self.stats = PrefetchStats()
+        self._queue = queue.Queue(maxsize=prefetch)
+        self._stop = threading.Event()
+        # one staging buffer: the device copy of a batch is complete before
+        # the next batch is gathered into it
+        self._staging = jax.tree.map(
+            lambda a: np.empty((batch_size,) + a.shape[1:], a.dtype),
+            self.data)
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        return self.n_epochs * -(-self.n // self.batch_size)
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _produce(self):
+        try:
+            key = self.key
+            for _ in range(self.n_epochs):
+                key, perm_key, transform_key = random.split(key, 3)
+                indices = (np.asarray(random.permutation(perm_key, self.n))
+                           if self.shuffle else np.arange(self.n))
+                for b, start in enumerate(range(0, self.n, self.batch_size)):
+                    if self._stop.is_set():
+                        return
+                    t0 = perf_counter()
+                    idx = indices[start:start + self.batch_size]
+                    batch = jax.tree.map(
+                        lambda a, buf: np.take(a, idx, axis=0,
+                                               out=buf[:len(idx)]),
+                        self.data, self._staging)
+                    batch = _device_copy(jax.device_put(batch, self.device))
+                    if self.transform is not None:
+                        batch = self.transform(
+                            random.fold_in(transform_key, b), batch)
+                    jax.block_until_ready(batch)
+                    self.stats.produce_time += perf_counter() - t0
+                    self._put(batch)
+        except Exception as e:     # raised in the training loop
+            self._put(e)
+            return
+        self._put(_DONE)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        t0 = perf_counter()
+        item = self._queue.get()
+        self.stats.stall_time += perf_counter() - t0
+        if item is _DONE:
+            self._queue.put(_DONE)      # further calls stop as well
+            raise StopIteration
+        if isinstance(item, Exception):
+            self._queue.put(_DONE)      # the producer has stopped
+            raise item
+        self.stats.batches += 1
+        return item
+
+    def close(self):
+        """Stop the background thread, later calls of `next` stop too."""
+        self._stop.set()
+        self._thread.join()
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put(_DONE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------------------------------------------------------------- benchmark
+
+add_noise_func = lambda x: x + 10
+horizontal_flip_func = lambda x: x + 1
+rotate_func = lambda x: x + 2
+adjust_colors_func = lambda x: x + 3
+
+augmentations = [
+    add_noise_func,
+    horizontal_flip_func,
+    rotate_func,
+    adjust_colors_func
+    ]
+
+
+def random_augmentation(image, augmentations, rng_key):
+    augmentation_index = random.randint(key=rng_key, minval=0, maxval=len(augmentations), shape=())
+    augmented_image = lax.switch(augmentation_index, augmentations, image)
+    return augmented_image
+
+
+@jax.jit
+def augment(key, batch):
+    """random_augmentation of every image of an (images, labels) batch."""
+    images, labels = batch
+    keys = random.split(key, len(images))
+    images = jax.vmap(random_augmentation, in_axes=(0, None, 0))(
+        images, augmentations, keys)
+    return images, labels
+
+
+def init_mlp(key, sizes):
+    keys = random.split(key, len(sizes) - 1)
+    return [(random.normal(k, (m, n)) / np.sqrt(m), jnp.zeros(n))
+            for k, m, n in zip(keys, sizes[:-1], sizes[1:])]
+
+
+def loss_fn(params, images, labels):
+    x = images
+    for W, b in params[:-1]:
+        x = jax.nn.relu(x @ W + b)
+    W, b = params[-1]
+    logits = x @ W + b
+    return -jnp.mean(jnp.take_along_axis(jax.nn.log_softmax(logits),
+                                         labels[:, None], axis=1))
+
+
+@jax.jit
+def update(params, batch, learning_rate=1e-3):
+    grads = jax.grad(loss_fn)(params, *batch)
+    return jax.tree.map(lambda p, g: p - learning_rate * g, params, grads)
+
+
+def train_synchronous(params, key, data, batch_size, n_epochs):
+    """The notebook's loop: batches are built in the loop before each step."""
+    images, labels = data
+    for _ in range(n_epochs):
+        key, perm_key, transform_key = random.split(key, 3)
+        # get_batches on the host arrays, one epoch of index slices
+        indices = np.asarray(random.permutation(perm_key, len(images)))
+        for b, start in enumerate(range(0, len(images), batch_size)):
+            idx = indices[start:start + batch_size]
+            batch = jax.device_put((images[idx], labels[idx]))
+            batch = augment(random.fold_in(transform_key, b), batch)
+            params = update(params, batch)
+    return jax.block_until_ready(params)
+
+
+def train_prefetched(params, key, data, batch_size, n_epochs, prefetch):
+    with Prefetcher(key, data, batch_size, n_epochs, prefetch,
+                    transform=augment) as batches:
+        for batch in batches:
+            params = update(params, batch)
+        params = jax.block_until_ready(params)
+    return params, batches.stats
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    n_samples, n_features, n_classes = 60_000, 784, 10
+    data = (rng.random((n_samples, n_features), dtype=np.float32),
+            rng.integers(0, n_classes, n_samples).astype(np.int32))
+    batch_size, n_epochs = 128, 2
+    key = random.PRNGKey(42)
+
+    # validation: same batches as the synchronous loop, each row once per
+    # epoch, batches kept after the staging buffer is reused
+    small = (np.arange(1000, dtype=np.float32)[:, None] * np.ones(4,
+                                                                np.float32),
+             np.arange(1000, dtype=np.int32))
+    expected = [b for b in get_batches(random.split(key, 3)[1],
+                                       jnp.asarray(small[1]), 64)]
+    with Prefetcher(key, small, 64, n_epochs=1, prefetch=3) as batches:
+        got = list(batches)
+    if not (len(got) == len(expected)
+            and all(np.array_equal(g[1], e) for g, e in zip(got, expected))
+            and all(np.array_equal(g[0][:, 0], g[1]) for g in got)):
+        print(f'{sys.argv[0]}: ERROR: prefetched batches differ from '
+              'get_batches', file=sys.stderr)
+        sys.exit(1)
+
+    params = init_mlp(random.PRNGKey(0), [n_features, 256, n_classes])
+    # compile update, augment and the device copy for full and last batch
+    train_synchronous(params, key, data, batch_size, 1)
+    train_prefetched(params, key, data, batch_size, 1, 1)
+
+    n_steps = n_epochs * -(-n_samples // batch_size)
+    print(f"MLP {n_features}-256-{n_classes}, {n_samples} samples, "
+          f"batch {batch_size}, {n_epochs} epochs, {n_steps} steps, "
+          f"{os.cpu_count()} cores")
+    if os.cpu_count() == 1:
+        print("one core: the producer thread and the training step take "
+              "turns, prefetching cannot hide the batch preparation")
+    print(f"{'pipeline':<14} {'wall (s)':>9} {'samples/s':>10} "
+          f"{'stall (s)':>10} {'produce (s)':>12}")
+    t0 = perf_counter()
+    p_sync = train_synchronous(params, key, data, batch_size, n_epochs)
+    t_sync = perf_counter() - t0
+    print(f"{'synchronous':<14} {t_sync:>9.2f} "
+          f"{n_epochs * n_samples / t_sync:>10.0f} {'-':>10} {'-':>12}")
+    for prefetch in [1, 2, 4]:
+        t0 = perf_counter()
+        p_pre, stats = train_prefetched(params, key, data, batch_size,
+                                        n_epochs, prefetch)
+        t_pre = perf_counter() - t0
+        print(f"{f'prefetch {prefetch}':<14} {t_pre:>9.2f} "
+              f"{n_epochs * n_samples / t_pre:>10.0f} "
+              f"{stats.stall_time:>10.2f} {stats.produce_time:>12.2f}")
+    if not all(jax.tree.leaves(jax.tree.map(
+            lambda a, b: jnp.allclose(a, b, rtol=1e-4, atol=1e-6),
+            p_sync, p_pre))):
+        print(f'{sys.argv[0]}: ERROR: prefetched training differs',
+              file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Log-depth scans for linear recurrences and running statistics.
+
+`advanced_concepts.ipynb` contrasts `regular_scan_sum` with
+`parallel_scan_sum` and computes `running_stats`, `cumsum_scan` and
+`scan_loop` (x_t = 0.99 x_{t-1} + n_t) with `lax.scan`. `lax.scan` takes
+T dependent steps. `lax.associative_scan` needs only an associative
+combine of two partial results. It evaluates them in a tree of depth
+O(log T) with O(T) combines of whole arrays, so XLA can vectorize and
+thread the work, at about twice the arithmetic of the sequential scan.
+The combines here are:
+
+  linear recurrence  h_t = a_t h_{t-1} + b_t: element (a, b),
+                     (a1, b1) then (a2, b2) = (a1 a2, a2 b1 + b2)
+  mean / variance    element (count, mean, M2), merged with the pairwise
+                     update of Chan et al. (Welford's step for count 1)
+  min / max          element (min, max)
+
+Each function has a sequential `*_scan` counterpart with `lax.scan` and a
+`*_np` reference in NumPy float64 for validation.
+
+Run `python scans.py` to validate and to compare associative and
+sequential scans for T = 10^3 to 10^7.
+"""
+
+import argparse
+import os
+import sys
+from time import perf_counter
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+from jax import jit, lax
+
+
+# ---------------------------------------------------- linear recurrences
+
+def _linear_combine(left, right):
+    a1, b1 = left
+    a2, b2 = right
+    return a1 * a2, a2 * b1 + b2
+
+
+@jit
+def linear_recurrence(a, b, h0=0.0):
+    """
+    h_t = a_t h_{t-1} + b_t for t = 0 .. T-1 with h_{-1} = h0.
+
+    a and b have a leading time axis of length T and broadcast to each
+    other, so a can be a scalar sequence for vector states b (T, ...).
+    Returns h with the shape of b.
+    """
+    a, b = jnp.broadcast_arrays(a, b)
+    if b.shape[0] == 0:
+        return b
+    b = b.at[0].add(a[0] * h0)
+    _, h = lax.associative_scan(_linear_combine, (a, b))
+    return h
+
+
+@jit
+def linear_recurrence_scan(a, b, h0=0.0):
+    """linear_recurrence with lax.scan."""
+    a, b = jnp.broadcast_arrays(a, b)
+
+    def step(h, ab):
+        h = ab[0] * h + ab[1]
+        return h, h
+
+    _, h = lax.scan(step, jnp.zeros(b.shape[1:], b.dtype) + h0, (a, b))
+    return h
+
+
+def linear_recurrence_np(a, b, h0=0.0):
+    a, b = np.broadcast_arrays(np.asarray(a, np.float64),
+                               np.asarray(b, np.float64))
+    h = np.empty_like(b)
+    prev = h0
+    for t in range(len(b)):
+        prev = h[t] = a[t] * prev + b[t]
+    return h
+
+
+# ---------------------------------------------------- running mean, variance
+
+def _stats_combine(left, right):
+    n_a, mean_a, m2_a = left
+    n_b, mean_b, m2_b = right
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    return (n, mean_a + delta * n_b / n,
+            m2_a + m2_b + delta * delta * n_a * n_b / n)
+
+
+@jit
+def running_stats(xs):
+    """Running mean and (population) variance of xs along axis 0."""
+    xs = jnp.asarray(xs, jnp.result_type(xs, float))    # integer samples
+    ones = jnp.ones_like(xs)
+    n, means, m2 = lax.associative_scan(_stats_combine,
+                                        (ones, xs, jnp.zeros_like(xs)))
+    return means, m2 / n
+
+
+@jit
+def running_stats_scan(xs):
+    """Compute running mean and variance."""
+    xs = jnp.asarray(xs, jnp.result_type(xs, float))
+
+    def body(carry, x):
+        count, mean, M2 = carry
+        count = count + 1
+        delta = x - mean
+        mean = mean + delta / count
+        delta2 = x - mean
+        M2 = M2 + delta * delta2
+        variance = M2 / count
+        return (count, mean, M2), (mean, variance)
+
+    zero = jnp.zeros(xs.shape[1:], xs.dtype)
+    init_carry = (zero, zero, zero)
+    _, (means, variances) = lax.scan(body, init_carry, xs)
+    return means, variances
+
+
+def running_stats_np(xs):
+    xs = np.asarray(xs, np.float64)
+    n = np.arange(1, len(xs) + 1).reshape((-1,) + (1,) * (xs.ndim - 1))
+    means = np.cumsum(xs, axis=0) / n
+    # two-pass per prefix is O(T^2), the shifted sums are exact enough in
+    # float64 for the validation sizes
+    shifted = xs - xs[:1]
+    variances = (np.cumsum(shifted ** 2, axis=0) / n
+                 - (np.cumsum(shifted, axis=0) / n) ** 2)
+    return means, variances
+
+
+# ---------------------------------------------------- running min, max
+
+def _minmax_combine(left, right):
+    return jnp.minimum(left[0], right[0]), jnp.maximum(left[1], right[1])
+
+
+@jit
+def running_minmax(xs):
+    """Running minimum and maximum of xs along axis 0."""
+    return lax.associative_scan(_minmax_combine, (xs, xs))
+
+
+@jit
+def running_minmax_scan(xs):
+    """running_minmax with lax.scan."""
+    if xs.shape[0] == 0:
+        return xs, xs
+
+    def body(carry, x):
+        carry = jnp.minimum(carry[0], x), jnp.maximum(carry[1], x)
+        return carry, carry
+
+    _, (mins, maxs) = lax.scan(body, (xs[0], xs[0]), xs)
+    return mins, maxs
+
+
+def running_minmax_np(xs):
+    xs = np.asarray(xs, np.float64)
+    return np.minimum.accumulate(xs), np.maximum.accumulate(xs)
+
+
+# ---------------------------------------------------- benchmark
+
+def best_time(func, args, repeat=3):
+    jax.block_until_ready(func(*args))   # compile
+    best = np.inf
+    for _ in range(repeat):
+        start = perf_counter()
+        jax.block_until_ready(func(*args))
+        best = min(best, perf_counter() - start)
+    return best
+
+
+# name: (associative, sequential, reference, arguments for T samples)
+KERNELS = {
+    "linear_recurrence": (
+        linear_recurrence, linear_recurrence_scan, linear_recurrence_np,
+        lambda key, T: (jax.random.uniform(key, (T,), minval=0.9,
+                                           maxval=1.0),
+                        jax.random.normal(jax.random.fold_in(key, 1),
+                                          (T,)))),
+    "running_stats": (
+        running_stats, running_stats_scan, running_stats_np,
+        lambda key, T: (2.0 * jax.random.normal(key, (T,)) + 5.0,)),
+    "running_minmax": (
+        running_minmax, running_minmax_scan, running_minmax_np,
+        lambda key, T: (jax.random.normal(key, (T,)),)),
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--max-exp", type=int, default=7,
+                        help="largest T is 10^MAX_EXP")
+    args = parser.parse_args()
+    key = jax.random.PRNGKey(0)
+
+    # validation against NumPy float64, also for vector states and h0,
+    # integer samples and empty sequences
+    cases = {name: make(key, 10_000) for name, (*_, make)
+             in KERNELS.items()}
+    a, b = cases["linear_recurrence"]
+    cases["linear_recurrence vector"] = (
+        a[:, None], jax.random.normal(key, (10_000, 3)), 1.5)
+    cases["running_stats integer"] = (jnp.arange(10_000) % 7,)
+    for name, (*_, make) in KERNELS.items():
+        cases[f"{name} empty"] = make(key, 0)
+    for name, case in cases.items():
+        assoc, seq, ref, _ = KERNELS[name.split()[0]]
+        expected = ref(*case)
+        for impl in (assoc, seq):
+            result = impl(*case)
+            if not all(np.shape(r) == np.shape(e)
+                       and np.allclose(r, e, rtol=1e-4, atol=1e-4)
+                       for r, e in zip(jax.tree.leaves(result),
+                                       jax.tree.leaves(expected))):
+                print(f'{sys.argv[0]}: ERROR: {impl.__name__} differs from '
+                      f'the NumPy reference', file=sys.stderr)
+                sys.exit(1)
+
+    print(f"{jax.device_count()} {jax.devices()[0].platform} device, "
+          f"{os.cpu_count()} cores, float32, times in ms")
+    print(f"{'T':>8} " + " ".join(f"{name + ' scan':>22} {'assoc':>8} "
+                                  f"{'x':>5}" for name in KERNELS))
+    for exp in range(3, args.max_exp + 1):
+        T = 10 ** exp
+        cells = []
+        for name, (assoc, seq, _, make) in KERNELS.items():
+            inputs = make(key, T)
+            t_seq = best_time(seq, inputs)
+            t_assoc = best_time(assoc, inputs)
+            cells.append(f"{1e3 * t_seq:>22.2f} {1e3 * t_assoc:>8.2f} "
+                         f"{t_seq / t_assoc:>5.1f}")
+        print(f"{T:>8.0e} " + " ".join(cells))
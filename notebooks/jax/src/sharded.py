@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Sharded execution of the `parallel_intro.ipynb` and `jax_intro.ipynb`
+workloads over the cores of a CPU node.
+
+On a machine without accelerators JAX has a single CPU device, so `pmap`
+has nothing to map over. Like the notebook, the script adds
+`--xla_force_host_platform_device_count` to XLA_FLAGS before JAX is
+imported, so the host cores appear as separate XLA CPU devices (one per
+core, unless XLA_FLAGS already sets a count). Importing the module leaves
+XLA_FLAGS alone; set the flag before importing JAX to get several devices
+there. The workloads are then split over a 1-d mesh of the first k devices
+in two ways:
+
+  shard_map  the function runs on each device's block of rows
+             (`jax.shard_map` with explicit in/out PartitionSpecs)
+  jit        `jax.jit` with NamedSharding annotations on inputs and outputs,
+             the compiler partitions the computation
+
+`scaled_dot` is batched over pairs of 3-vectors, so the pairs are split.
+For `euclidean_distance_jax(x, y)` the rows of x are split and y is copied
+to every device. Strong scaling keeps the problem size fixed and reports
+the speedup T(1) / T(k) and the efficiency T(1) / (k T(k)). This is a way
+to check multi-device layouts on an ordinary Linux box before moving to
+accelerators.
+
+Run `python sharded.py`, or choose the device count with
+`XLA_FLAGS=--xla_force_host_platform_device_count=8 python sharded.py`.
+"""
+
+import math
+import os
+import sys
+from time import perf_counter
+
+DEVICE_COUNT_FLAG = "--xla_force_host_platform_device_count"
+
+# only when run as a script, and before jax is imported, later it has no
+# effect; the other XLA flags are kept
+if (__name__ == '__main__' and "jax" not in sys.modules
+        and DEVICE_COUNT_FLAG not in os.environ.get("XLA_FLAGS", "")):
+    os.environ["XLA_FLAGS"] = (os.environ.get("XLA_FLAGS", "") +
+                               f" {DEVICE_COUNT_FLAG}={os.cpu_count()}"
+                               ).strip()
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+from jax.sharding import Mesh, NamedSharding, PartitionSpec as P
+
+AXIS = "d"      # name of the mesh axis that the data is split over
+MODES = ("shard_map", "jit")
+
+
+def scaled_dot(v1, v2, koeff):
+    return koeff * jnp.vdot(v1, v2)
+
+
+def euclidean_distance_jax(x, y):
+    x2 = jnp.einsum('ij,ij->i', x, x)[:, jnp.newaxis]
+    y2 = jnp.einsum('ij,ij->i', y, y)[jnp.newaxis, :]
+    xy = x @ y.T
+    return jnp.abs(x2 + y2 - 2.0 * xy)
+
+
+def device_mesh(n_devices):
+    """1-d mesh over the first `n_devices` devices."""
+    devices = jax.devices()
+    if n_devices > len(devices):
+        raise ValueError(f"{n_devices} devices requested, {len(devices)} "
+                         f"available (set {DEVICE_COUNT_FLAG} in XLA_FLAGS)")
+    return Mesh(np.array(devices[:n_devices]), (AXIS,))
+
+
+def scaled_dot_sharded(mesh, mode="shard_map"):
+    """scaled_dot for pairs of vectors, rows of v1 and v2 (n, 3), split over
+    the mesh; koeff is copied to all devices."""
+    batched = jax.vmap(scaled_dot, in_axes=(0, 0, None))
+    if mode == "shard_map":
+        return jax.jit(jax.shard_map(batched, mesh=mesh,
+                                     in_specs=(P(AXIS), P(AXIS), P()),
+                                     out_specs=P(AXIS)))
+    rows = NamedSharding(mesh, P(AXIS))
+    return jax.jit(batched,
+                   in_shardings=(rows, rows, NamedSharding(mesh, P())),
+                   out_shardings=rows)
+
+
+def euclidean_distance_sharded(mesh, mode="shard_map"):
+    """euclidean_distance_jax with the rows of x (and of the result) split
+    over the mesh; y is copied to all devices."""
+    if mode == "shard_map":
+        return jax.jit(jax.shard_map(euclidean_distance_jax, mesh=mesh,
+                                     in_specs=(P(AXIS, None), P()),
+                                     out_specs=P(AXIS, None)))
+    rows = NamedSharding(mesh, P(AXIS, None))
+    return jax.jit(euclidean_distance_jax,
+                   in_shardings=(rows, NamedSharding(mesh, P())),
+                   out_shardings=rows)
+
+
+# workload: (sharded function factory, input specs); specs of None are
+# passed as they are
+WORKLOADS = {
+    "scaled_dot": (scaled_dot_sharded, (P(AXIS), P(AXIS), None)),
+    "euclidean_distance": (euclidean_distance_sharded, (P(AXIS, None), P())),
+}
+
+
+def place(args, specs, mesh):
+    """Put the arguments on the mesh with the given PartitionSpecs."""
+    return tuple(a if spec is None
+                 else jax.device_put(a, NamedSharding(mesh, spec))
+                 for a, spec in zip(args, specs))
+
+
+def best_time(func, args, repeat=5):
+    jax.block_until_ready(func(*args))   # compile
+    best = np.inf
+    for _ in range(repeat):
+        start = perf_counter()
+        jax.block_until_ready(func(*args))
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def strong_scaling(workload, args, device_counts, mode="shard_map",
+                   repeat=5):
+    """
+    Time `workload` on the fixed inputs `args` for each device count.
+
+    Returns a list of (devices, time, speedup, efficiency) relative to the
+    first device count, and the result on the largest mesh.
+    """
+    factory, specs = WORKLOADS[workload]
+    times = []
+    for k in device_counts:
+        mesh = device_mesh(k)
+        func = factory(mesh, mode)
+        placed = place(args, specs, mesh)
+        times.append(best_time(func, placed, repeat))
+    k0, t0 = device_counts[0], times[0]
+    rows = [(k, t, t0 / t, t0 * k0 / (t * k))
+            for k, t in zip(device_counts, times)]
+    return rows, func(*placed)
+
+
+def default_device_counts():
+    """1, 2, 4, ... up to and including the number of devices."""
+    n = jax.device_count()
+    counts = [2 ** i for i in range(n.bit_length()) if 2 ** i <= n]
+    return counts if counts[-1] == n else counts + [n]
+
+
+if __name__ == '__main__':
+    device_counts = default_device_counts()
+    multiple = math.lcm(*device_counts)   # every mesh splits the rows evenly
+
+    key1, key2 = jax.random.split(jax.random.PRNGKey(42))
+    n_vectors = 10_000_000 // multiple * multiple
+    vs = jax.random.normal(key1, (2 * n_vectors, 3))
+    n_points = 4096 // multiple * multiple
+    x = jax.random.normal(key2, (2 * n_points, 256))
+    inputs = {
+        "scaled_dot": (vs[:n_vectors], vs[n_vectors:], 2.0),
+        "euclidean_distance": (x[:n_points], x[n_points:]),
+    }
+    expected = {
+        "scaled_dot": jax.jit(jax.vmap(scaled_dot, in_axes=(0, 0, None)))(
+            *inputs["scaled_dot"]),
+        "euclidean_distance": jax.jit(euclidean_distance_jax)(
+            *inputs["euclidean_distance"]),
+    }
+
+    print(f"{jax.device_count()} {jax.devices()[0].platform} devices, "
+          f"{os.cpu_count()} cores")
+    if jax.device_count() > os.cpu_count():
+        print("more devices than cores: the efficiency drops beyond "
+              f"{os.cpu_count()} devices")
+    sizes = {"scaled_dot": f"{n_vectors} pairs of 3-vectors",
+             "euclidean_distance": f"{n_points} x {n_points} distances, "
+                                   f"dim 256"}
+    for workload, args in inputs.items():
+        results = {}
+        for mode in MODES:
+            rows, result = strong_scaling(workload, args, device_counts, mode)
+            if not np.allclose(np.asarray(result),
+                               np.asarray(expected[workload]),
+                               rtol=1e-4, atol=1e-3):
+                print(f'{sys.argv[0]}: ERROR: {workload} ({mode}) differs '
+                      'from the single device result', file=sys.stderr)
+                sys.exit(1)
+            results[mode] = rows
+
+        print(f"\n{workload}, {sizes[workload]}")
+        print(f"{'devices':>7} " + " ".join(
+            f"{mode + ' [ms]':>15} {'speedup':>7} {'eff':>5}"
+            for mode in MODES))
+        for i, k in enumerate(device_counts):
+            print(f"{k:>7} " + " ".join(
+                f"{1e3 * t:>15.2f} {s:>7.2f} {e:>5.2f}"
+                for _, t, s, e in (results[mode][i] for mode in MODES)))
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Cost-aware scheduling on top of multiprocessing.Pool.
+
+`p.map` with the default chunksize and one `apply_async` per item are the two
+patterns used in `note_multiprocessing.ipynb`. The first can leave a worker with
+a chunk of slow tasks while the others sit idle (stragglers), the second pays
+one round trip through the task queue per item (IPC overhead). `CostScheduler`
+sits between the two:
+
+- with per-task cost estimates, items are dispatched in
+  longest-processing-time-first (LPT) order and grouped into chunks whose cost
+  shrinks towards the end of the run (guided self-scheduling);
+- without estimates, task durations are learned online from a probe wave and
+  the chunksize of every following wave is adapted to them.
+
+Chunks are streamed back through `imap_unordered` and reassembled in input
+order, and a tqdm progress bar is kept.
+
+Run `python scheduling.py` for a makespan/utilization comparison.
+"""
+
+import math
+import multiprocessing as mp
+import os
+from collections import deque
+from dataclasses import dataclass, field
+from time import perf_counter, sleep
+
+import numpy as np
+import tqdm
+
+
+@dataclass
+class ScheduleStats:
+    """Timing summary of one scheduled map."""
+    makespan: float = 0.0        # wall time from first dispatch to last result [s]
+    busy_time: float = 0.0       # sum of task execution times over all workers [s]
+    processes: int = 1
+    chunksizes: list = field(default_factory=list)
+
+    @property
+    def utilization(self):
+        """Fraction of the available worker time spent executing tasks."""
+        if self.makespan == 0.0:
+            return 0.0
+        return self.busy_time / (self.makespan * self.processes)
+
+    @property
+    def n_chunks(self):
+        return len(self.chunksizes)
+
+
+def _run_chunk(args):
+    """Execute a chunk of (index, item) pairs in a worker.
+
+    Returns the chunk results together with the time spent executing them, so
+    the parent can learn task durations and compute worker utilization.
+    """
+    func, chunk = args
+    out = []
+    t0 = perf_counter()
+    for i, item in chunk:
+        out.append((i, func(item)))
+    return out, perf_counter() - t0
+
+
+def _timed_call(args):
+    """Execute one task and return (result, duration); used by the baselines."""
+    func, item = args
+    t0 = perf_counter()
+    res = func(item)
+    return res, perf_counter() - t0
+
+
+class CostScheduler:
+    """
+    Map a function over items with a `multiprocessing.Pool`, balancing load
+    either from cost estimates or from durations measured while running.
+
+    Parameters
+    ----------
+    processes : int, optional
+        number of worker processes, defaults to `os.cpu_count()`
+    min_chunk_time : float
+        lower bound on the execution time of one chunk [s]; chunks of cheap
+        tasks are grown until they reach it so that IPC does not dominate
+    probe_size : int, optional
+        number of items executed one by one to estimate task durations when
+        no costs are given, defaults to `2 * processes`
+    progress : bool
+        show a tqdm progress bar
+    """
+
+    def __init__(self, processes=None, min_chunk_time=0.01, probe_size=None,
+                 progress=True):
+        self.processes = processes or os.cpu_count()
+        self.min_chunk_time = min_chunk_time
+        self.probe_size = probe_size or 2 * self.processes
+        self.progress = progress
+        self.stats = ScheduleStats(processes=self.processes)
+
+    def map(self, func, items, costs=None, pool=None):
+        """
+        Apply `func` to every element of `items` and return the results in
+        input order.
+
+        Parameters
+        ----------
+        func : callable
+            picklable (module level) function of one argument
+        items : sequence
+            task arguments
+        costs : sequence of float, optional
+            relative cost estimate per item; enables LPT ordering
+        pool : multiprocessing.Pool, optional
+            reuse an existing pool instead of creating one
+
+        Returns
+        -------
+        list
+            `[func(x) for x in items]`
+        """
+        items = list(items)
+        if costs is not None and len(costs) != len(items):
+            raise ValueError("costs must have the same length as items")
+
+        self.stats = ScheduleStats(processes=self.processes)
+        results = [None] * len(items)
+        if not items:
+            return results
+
+        own_pool = pool is None
+        if own_pool:
+            pool = mp.Pool(processes=self.processes)
+        try:
+            with tqdm.tqdm(total=len(items), desc="Processing",
+                           disable=not self.progress) as pbar:
+                t0 = perf_counter()
+                if costs is None:
+                    self._map_adaptive(pool, func, items, results, pbar)
+                else:
+                    self._map_lpt(pool, func, items, costs, results, pbar)
+                self.stats.makespan = perf_counter() - t0
+        finally:
+            if own_pool:
+                pool.close()
+                pool.join()
+        return results
+
+    def _collect(self, chunk_result, results, pbar):
+        out, busy = chunk_result
+        for i, res in out:
+            results[i] = res
+        self.stats.busy_time += busy
+        pbar.update(len(out))
+        return len(out), busy
+
+    def _map_lpt(self, pool, func, items, costs, results, pbar):
+        """Dispatch in descending cost order with guided chunk sizes."""
+        order = np.argsort(-np.asarray(costs, dtype=float), kind="stable")
+        sorted_costs = np.asarray(costs, dtype=float)[order]
+        remaining = float(sorted_costs.sum())
+
+        chunks = []
+        start = 0
+        while start < len(order):
+            # each chunk takes at most 1/(2p) of the remaining work, so the
+            # expensive head is dispatched item by item and the cheap tail
+            # is grouped to save round trips
+            target = remaining / (2 * self.processes)
+            stop = start + 1
+            acc = sorted_costs[start]
+            while stop < len(order) and acc + sorted_costs[stop] <= target:
+                acc += sorted_costs[stop]
+                stop += 1
+            chunks.append([(int(i), items[i]) for i in order[start:stop]])
+            remaining -= acc
+            start = stop
+
+        self.stats.chunksizes = [len(c) for c in chunks]
+        tasks = ((func, c) for c in chunks)
+        for chunk_result in pool.imap_unordered(_run_chunk, tasks):
+            self._collect(chunk_result, results, pbar)
+
+    def _map_adaptive(self, pool, func, items, results, pbar):
+        """
+        Dispatch in waves whose chunksize follows the measured task duration.
+
+        The next wave is queued once half of the current one has returned, so
+        workers do not idle at wave boundaries while the estimate is updated.
+        """
+        n = len(items)
+        next_item = 0
+        mean_duration = None
+        in_flight = deque()     # [iterator, chunks outstanding]
+
+        def submit(chunksize, n_items):
+            nonlocal next_item
+            stop = min(n, next_item + n_items)
+            chunks = [[(i, items[i]) for i in range(s, min(s + chunksize, stop))]
+                      for s in range(next_item, stop, chunksize)]
+            next_item = stop
+            self.stats.chunksizes.extend(len(c) for c in chunks)
+            it = pool.imap_unordered(_run_chunk, ((func, c) for c in chunks))
+            in_flight.append([it, len(chunks)])
+
+        def next_wave():
+            n_rem = n - next_item
+            if mean_duration is None or mean_duration == 0.0:
+                chunksize = 1
+            else:
+                chunksize = math.ceil(self.min_chunk_time / mean_duration)
+            if n_rem <= 2 * self.processes * chunksize:
+                n_items = n_rem
+            else:
+                n_items = math.ceil(n_rem / 2)
+            # at least two chunks per worker inside a wave for balance
+            chunksize = max(1, min(chunksize,
+                                   math.ceil(n_items / (2 * self.processes))))
+            submit(chunksize, n_items)
+
+        submit(1, self.probe_size)
+        done_items = 0
+        done_time = 0.0
+        while in_flight:
+            wave = in_flight[0]
+            half = wave[1] // 2
+            for chunk_result in wave[0]:
+                count, busy = self._collect(chunk_result, results, pbar)
+                done_items += count
+                done_time += busy
+                mean_duration = done_time / done_items
+                wave[1] -= 1
+                if wave[1] <= half and len(in_flight) == 1 and next_item < n:
+                    next_wave()
+            in_flight.popleft()
+            if not in_flight and next_item < n:
+                next_wave()
+
+
+def baseline_apply_async(pool, processes, func, items, progress=False):
+    """One `apply_async` per item with a tqdm callback (notebook pattern),
+    on a pool of `processes` workers."""
+    stats = ScheduleStats(processes=processes)
+    t0 = perf_counter()
+    with tqdm.tqdm(total=len(items), disable=not progress) as pbar:
+        async_res = [pool.apply_async(_timed_call, args=((func, x),),
+                                      callback=lambda _: pbar.update(1))
+                     for x in items]
+        out = [r.get() for r in async_res]
+    stats.makespan = perf_counter() - t0
+    stats.busy_time = sum(d for _, d in out)
+    stats.chunksizes = [1] * len(items)
+    return [r for r, _ in out], stats
+
+
+def baseline_map(pool, processes, func, items):
+    """`Pool.map` with its default chunksize (notebook pattern), on a pool
+    of `processes` workers."""
+    stats = ScheduleStats(processes=processes)
+    t0 = perf_counter()
+    out = pool.map(_timed_call, [(func, x) for x in items])
+    stats.makespan = perf_counter() - t0
+    stats.busy_time = sum(d for _, d in out)
+    return [r for r, _ in out], stats
+
+
+def unequal_task(duration):
+    sleep(duration)
+    return duration
+
+
+def square(num):
+    return num * num
+
+
+def _report(name, stats):
+    print(f"  {name:<26} makespan {stats.makespan:8.3f} s   "
+          f"utilization {100 * stats.utilization:5.1f} %")
+
+
+if __name__ == '__main__':
+    processes = 4
+    rng = np.random.default_rng(2)
+
+    # a few long tasks hidden among many short ones, sorted so that the
+    # default map chunksize puts the long ones into the same chunk
+    durations = np.sort(rng.exponential(0.02, size=400))
+    durations[-8:] = 0.5
+    durations = durations.tolist()
+    lower_bound = max(sum(durations) / processes, max(durations))
+    print(f"Unequal tasks: n={len(durations)}, total work "
+          f"{sum(durations):.2f} s, ideal makespan {lower_bound:.3f} s")
+
+    with mp.Pool(processes=processes) as pool:
+        ref, stats = baseline_apply_async(pool, processes, unequal_task,
+                                          durations)
+        _report("apply_async per item", stats)
+        res, stats = baseline_map(pool, processes, unequal_task, durations)
+        _report("Pool.map", stats)
+
+        sched = CostScheduler(processes=processes, progress=False)
+        res = sched.map(unequal_task, durations, pool=pool)
+        assert res == ref
+        _report("CostScheduler (learned)", sched.stats)
+        res = sched.map(unequal_task, durations, costs=durations, pool=pool)
+        assert res == ref
+        _report("CostScheduler (LPT)", sched.stats)
+
+        n = 200_000
+        print(f"\nCheap tasks: n={n}")
+        items = list(range(n))
+        ref, stats = baseline_apply_async(pool, processes, square, items)
+        _report("apply_async per item", stats)
+        res, stats = baseline_map(pool, processes, square, items)
+        _report("Pool.map", stats)
+        res = sched.map(square, items, pool=pool)
+        assert res == ref
+        _report("CostScheduler (learned)", sched.stats)
+        print(f"  {'':<26} chunks {sched.stats.n_chunks}, "
+              f"largest chunksize {max(sched.stats.chunksizes)}")
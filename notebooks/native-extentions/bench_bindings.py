@@ -0,0 +1,330 @@
+"""
+One benchmark for the kernels that the notebooks implement in several
+technologies.
+
+Every binding registers its implementations of `dot` (v . w), `gemv`
+(alpha A x + beta y) and `matmul` (A @ B) with `register`. All of them get the
+same float64 inputs for a sweep of sizes, are called once to warm up (JIT
+compilation, first touch of the output) and validated against NumPy, then
+timed repeatedly up to a time budget. Bindings whose extension is not built
+are skipped:
+
+  python    pydot, gemv and matrix_multiply_python from the notebooks
+  numpy     np.dot, gemv_v2, np.matmul
+  numba     udot from speeding_up__with_Cython.ipynb and gemv_v1 from
+            numba/src/kernels.py
+  cython    cython/src/dot.pyx                 python setup.py build_ext --inplace
+  pybind11  pybind11/src/matrix_multiply_fast  python setup.py build_ext --inplace
+  swig      swig/example_2_vector/benchmark    ./build.sh
+
+Implementations marked `/lists` take nested lists, as in the notebooks; the
+arrays are converted before timing, so the times include only what the
+binding does with the lists.
+
+The results are written to a CSV file, one row per kernel, implementation
+and size, and printed as a table of times per call for each kernel and a
+summary of the call overhead (time at the smallest size) and the best
+throughput.
+
+Run `python bench_bindings.py` (see --help).
+"""
+
+import argparse
+import csv
+import os
+import statistics
+import sys
+from dataclasses import dataclass
+from time import perf_counter
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# where the extension of a binding is built, or its module lives
+BUILD_DIRS = {
+    "numba": os.path.join(HERE, "..", "numba", "src"),
+    "cython": os.path.join(HERE, "cython", "src"),
+    "pybind11": os.path.join(HERE, "pybind11", "src"),
+    "swig": os.path.join(HERE, "swig", "example_2_vector"),
+}
+
+KERNELS = ("dot", "gemv", "matmul")
+
+# n: vector length for dot, matrix dimension (n x n) for gemv and matmul
+SIZES = {
+    "dot": [1, 10, 10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7],
+    "gemv": [1, 4, 16, 64, 256, 1024, 4096],
+    "matmul": [1, 4, 16, 64, 256, 1024],
+}
+
+FLOPS = {
+    "dot": lambda n: 2 * n,
+    "gemv": lambda n: 2 * n * n + 3 * n,
+    "matmul": lambda n: 2 * n ** 3,
+}
+
+
+@dataclass
+class Impl:
+    """An implementation of a kernel by a binding."""
+    kernel: str
+    name: str               # binding[/variant]
+    func: object
+    lists: bool = False     # takes nested lists instead of arrays
+    max_size: int = None    # largest n to run, None = all
+
+    @property
+    def binding(self):
+        return self.name.split("/")[0]
+
+
+REGISTRY = {kernel: {} for kernel in KERNELS}   # kernel -> name -> Impl
+SKIPPED = {}                                    # binding -> reason
+
+
+def register(kernel, name, func, lists=False, max_size=None):
+    """Add `func` as the implementation `name` of `kernel`."""
+    if kernel not in REGISTRY:
+        raise ValueError(f"unknown kernel {kernel!r}, expected one of "
+                         f"{', '.join(KERNELS)}")
+    REGISTRY[kernel][name] = Impl(kernel, name, func, lists, max_size)
+    return func
+
+
+# ------------------------------------------------------------------ bindings
+
+def pydot(v, w):
+    if len(v) == len(w) and len(v) > 0:
+        res = v[0] * w[0]
+        for i in range(1, len(v)):
+            res += v[i] * w[i]
+    return res
+
+
+def gemv_python(alpha, A, x, beta, y):
+    return [alpha * sum(a * b for a, b in zip(row, x)) + beta * yi
+            for row, yi in zip(A, y)]
+
+
+def matrix_multiply_python(A, B):
+    """Pure Python implementation of matrix multiplication"""
+    m = len(A)           # rows of A
+    n = len(A[0])        # cols of A (rows of B)
+    p = len(B[0])        # cols of B
+
+    C = [[0.0 for _ in range(p)] for _ in range(m)]
+    for i in range(m):
+        for j in range(p):
+            for k in range(n):
+                C[i][j] += A[i][k] * B[k][j]
+    return C
+
+
+def gemv_v2(alpha, A, x, beta, y):
+    return alpha*(A @ x) + beta*y
+
+
+# the results are validated against these
+REFERENCE = {"dot": np.dot, "gemv": gemv_v2, "matmul": np.matmul}
+
+
+def udot(v, w):
+    res = 0
+    for i in range(0, len(v)):
+        res += v[i] * w[i]
+    return res
+
+
+def _python():
+    register("dot", "python", pydot, lists=True, max_size=10 ** 6)
+    register("gemv", "python", gemv_python, lists=True, max_size=1024)
+    register("matmul", "python", matrix_multiply_python, lists=True,
+             max_size=64)
+
+
+def _numpy():
+    register("dot", "numpy", np.dot)
+    register("gemv", "numpy", gemv_v2)
+    register("matmul", "numpy", np.matmul)
+
+
+def _numba():
+    import numba
+    from kernels import gemv_v1
+    register("dot", "numba", numba.njit(cache=True)(udot))
+    register("gemv", "numba", gemv_v1)
+
+
+def _cython():
+    import dot
+    register("dot", "cython", dot.dot)
+
+
+def _pybind11():
+    import matrix_multiply_fast
+    register("matmul", "pybind11/lists", matrix_multiply_fast.matrix_multiply,
+             lists=True, max_size=256)
+    register("matmul", "pybind11", matrix_multiply_fast.matmul)
+
+
+def _swig():
+    import benchmark
+    register("matmul", "swig/lists", benchmark.matrix_multiply, lists=True,
+             max_size=256)
+    register("matmul", "swig", benchmark.matrix_multiply_numpy)
+
+
+LOADERS = {"python": _python, "numpy": _numpy, "numba": _numba,
+           "cython": _cython, "pybind11": _pybind11, "swig": _swig}
+
+
+def load_bindings(names=tuple(LOADERS)):
+    """Register the implementations of the bindings `names` that can be
+    imported, the others are recorded in SKIPPED."""
+    for name in names:
+        path = BUILD_DIRS.get(name)
+        if path and path not in sys.path:
+            sys.path.insert(0, path)
+        try:
+            LOADERS[name]()
+        except ImportError as e:
+            SKIPPED[name] = f"not built ({e})"
+
+
+# ----------------------------------------------------------------- benchmark
+
+def make_inputs(kernel, n, seed=0):
+    rng = np.random.default_rng(seed)
+    if kernel == "dot":
+        return rng.random(n), rng.random(n)
+    if kernel == "gemv":
+        return 1.5, rng.random((n, n)), rng.random(n), 0.5, rng.random(n)
+    return rng.random((n, n)), rng.random((n, n))
+
+
+def as_lists(args):
+    return tuple(a.tolist() if isinstance(a, np.ndarray) else a for a in args)
+
+
+def time_call(func, args, min_time, max_repeat=1000):
+    """Best and median time of func(*args) over at least 3 calls, repeated
+    until `min_time` seconds or `max_repeat` calls."""
+    times = []
+    while len(times) < 3 or (sum(times) < min_time
+                             and len(times) < max_repeat):
+        start = perf_counter()
+        func(*args)
+        times.append(perf_counter() - start)
+    return min(times), statistics.median(times), len(times)
+
+
+def run(kernels=KERNELS, min_time=0.2, max_size=None):
+    """Benchmark all registered implementations of `kernels`, returns a list
+    of result rows (dicts)."""
+    rows = []
+    for kernel in kernels:
+        for n in SIZES[kernel]:
+            if max_size is not None and n > max_size:
+                continue
+            args = make_inputs(kernel, n)
+            expected = REFERENCE[kernel](*args)
+            list_args = None
+            for impl in REGISTRY[kernel].values():
+                if impl.max_size is not None and n > impl.max_size:
+                    continue
+                if impl.lists and list_args is None:
+                    list_args = as_lists(args)
+                call_args = list_args if impl.lists else args
+                result = impl.func(*call_args)    # warmup
+                valid = bool(np.allclose(np.asarray(result), expected,
+                                         rtol=1e-8, atol=1e-12))
+                best, median, repeats = time_call(impl.func, call_args,
+                                                  min_time)
+                rows.append({
+                    "kernel": kernel, "binding": impl.binding,
+                    "implementation": impl.name, "n": n,
+                    "flops": FLOPS[kernel](n), "best_s": best,
+                    "median_s": median, "repeats": repeats,
+                    "gflops": FLOPS[kernel](n) / best / 1e9, "valid": valid,
+                })
+    return rows
+
+
+def write_csv(rows, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def print_tables(rows):
+    for kernel in KERNELS:
+        kernel_rows = [r for r in rows if r["kernel"] == kernel]
+        if not kernel_rows:
+            continue
+        names = list(dict.fromkeys(r["implementation"] for r in kernel_rows))
+        width = max(10, *(len(name) for name in names))
+        cells = {(r["n"], r["implementation"]): r for r in kernel_rows}
+        print(f"\n{kernel}: time per call [us]")
+        print(f"{'n':>8} " + " ".join(f"{name:>{width}}" for name in names))
+        for n in dict.fromkeys(r["n"] for r in kernel_rows):
+            line = []
+            for name in names:
+                r = cells.get((n, name))
+                if r is None:
+                    line.append(f"{'-':>{width}}")
+                elif not r["valid"]:
+                    line.append(f"{'FAIL':>{width}}")
+                else:
+                    line.append(f"{1e6 * r['best_s']:>{width}.2f}")
+            print(f"{n:>8} " + " ".join(line))
+
+    print(f"\n{'kernel':<8} {'implementation':<16} {'overhead [us]':>14} "
+          f"{'at n':>5} {'GFLOP/s':>9} {'at n':>9}")
+    for kernel in KERNELS:
+        kernel_rows = [r for r in rows if r["kernel"] == kernel and r["valid"]]
+        for name in dict.fromkeys(r["implementation"] for r in kernel_rows):
+            impl_rows = [r for r in kernel_rows if r["implementation"] == name]
+            smallest = min(impl_rows, key=lambda r: r["n"])
+            fastest = max(impl_rows, key=lambda r: r["gflops"])
+            print(f"{kernel:<8} {name:<16} "
+                  f"{1e6 * smallest['best_s']:>14.2f} {smallest['n']:>5} "
+                  f"{fastest['gflops']:>9.3f} {fastest['n']:>9}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--kernels", nargs="+", choices=KERNELS,
+                        default=KERNELS)
+    parser.add_argument("--bindings", nargs="+", choices=tuple(LOADERS),
+                        default=tuple(LOADERS))
+    parser.add_argument("--csv", default="bench_bindings.csv",
+                        help="output file (default: %(default)s)")
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="seconds of calls per measurement "
+                             "(default: %(default)s)")
+    parser.add_argument("--max-size", type=int, default=None,
+                        help="skip sizes above this n")
+    args = parser.parse_args()
+
+    load_bindings(args.bindings)
+    for name, reason in SKIPPED.items():
+        print(f"skipped {name}: {reason}")
+
+    rows = run(args.kernels, args.min_time, args.max_size)
+    if not rows:
+        print(f'{sys.argv[0]}: ERROR: no implementation to benchmark',
+              file=sys.stderr)
+        sys.exit(1)
+    write_csv(rows, args.csv)
+    print_tables(rows)
+    print(f"\n{len(rows)} results written to {args.csv}")
+
+    failed = sorted({(r["kernel"], r["implementation"]) for r in rows
+                     if not r["valid"]})
+    if failed:
+        print(f'{sys.argv[0]}: ERROR: results differ from NumPy for '
+              + ", ".join(f"{k} {name}" for k, name in failed),
+              file=sys.stderr)
+        sys.exit(1)
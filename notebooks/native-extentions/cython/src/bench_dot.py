@@ -0,0 +1,77 @@
+"""
+Benchmark of the Cython `dot` extension (build first with
+`python setup.py build_ext --inplace`) against `pydot` from
+speeding_up__with_Cython.ipynb and np.dot, for each supported dtype, sizes
+10^2 to 10^7 and 1, 2, 4 and all cores. Times are per call in microseconds.
+
+Run: python bench_dot.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+import dot
+
+
+def pydot(v, w):
+    if len(v) == len(w) and len(v) > 0:
+        res = v[0] * w[0]
+        for i in range(1, len(v)):
+            res += v[i] * w[i]
+    return res
+
+
+def best_time(func, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+DTYPES = [np.int32, np.int64, np.float32, np.float64]
+
+
+if __name__ == '__main__':
+    n_cores = os.cpu_count()
+    threads = sorted({1, 2, 4, n_cores})
+
+    # validation, serial and parallel paths
+    for dtype in DTYPES:
+        for n in [0, 7, 3 * dot.PARALLEL_THRESHOLD + 5]:
+            v = (np.arange(n) % 7).astype(dtype)
+            w = (np.arange(n) % 5).astype(dtype)
+            expected = np.dot(v.astype(np.int64), w.astype(np.int64))
+            for nt in threads:
+                res = dot.dot(v, w, nt)
+                if res != expected:
+                    print(f'{sys.argv[0]}: ERROR: dot({np.dtype(dtype).name}, '
+                          f'n={n}, num_threads={nt}) = {res}, '
+                          f'expected {expected}', file=sys.stderr)
+                    sys.exit(1)
+
+    print(f"time per call [us], serial below {dot.PARALLEL_THRESHOLD} "
+          f"elements, {n_cores} hardware threads")
+    thread_cols = " ".join(f"{f'{nt} thr':>9}" for nt in threads)
+    print(f"{'dtype':>8} {'n':>6} {'pydot':>10} {'np.dot':>9} {thread_cols}")
+    for dtype in DTYPES:
+        for exp in range(2, 8):
+            n = 10 ** exp
+            v = np.random.randint(0, 100, n).astype(dtype)
+            w = np.random.randint(0, 100, n).astype(dtype)
+            repeat = max(3, min(1000, 10 ** 6 // n))
+            if n <= 10 ** 5:
+                t = best_time(lambda: pydot(v, w), max(1, repeat // 100))
+                py = f"{1e6 * t:>10.1f}"
+            else:
+                py = f"{'-':>10}"
+            t_np = best_time(lambda: np.dot(v, w), repeat)
+            cols = " ".join(
+                f"{1e6 * best_time(lambda: dot.dot(v, w, nt), repeat):>9.2f}"
+                for nt in threads)
+            print(f"{np.dtype(dtype).name:>8} {n:>6.0e} {py} "
+                  f"{1e6 * t_np:>9.2f} {cols}")
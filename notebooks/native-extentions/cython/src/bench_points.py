@@ -0,0 +1,130 @@
+"""
+Benchmark of points.PointCloud (build first with
+`python setup.py build_ext --inplace`) against lists of point objects: the
+Python `Point` class from speeding_up__with_Cython.ipynb and the `cdef class`
+points.Point.
+
+1. Memory per point, measured with tracemalloc on 10^5 points.
+2. Throughput of distance2origin and alpha in million points per second for
+   10^6 to 10^8 points. Lists of objects are limited to the sizes that fit in
+   memory, NumPy (np.hypot, np.arcsin) needs temporaries and stops at 10^7.
+
+Run: python bench_points.py
+"""
+
+import math
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import points
+
+
+class Point:
+    """A simple class representing a point in the x-y plane."""
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    def distance2origin(self):
+        return math.sqrt(self.x * self.x + self.y * self.y)
+
+    def alpha(self):
+        return math.asin(self.y / self.distance2origin())
+
+    def __repr__(self):
+        return "(%.1f, %.1f)" % (self.x, self.y)
+
+
+# largest number of points per representation
+MAX_POINTS = {"Point": 10 ** 6, "cdef Point": 10 ** 7, "numpy": 10 ** 7}
+
+
+def best_time(func, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def make_objects(cls, x, y):
+    return [cls(a, b) for a, b in zip(x.tolist(), y.tolist())]
+
+
+def bytes_per_point(build, n=10 ** 5):
+    tracemalloc.start()
+    obj = build(n)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del obj
+    return size / n
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(42)
+
+    # validation
+    x, y = rng.normal(size=1000), rng.normal(size=1000)
+    cloud = points.PointCloud(x, y)
+    objects = make_objects(Point, x, y)
+    if not (np.allclose(cloud.distance2origin(),
+                        [p.distance2origin() for p in objects])
+            and np.allclose(cloud.alpha(), [p.alpha() for p in objects])
+            and np.allclose(cloud.alpha(), [p.alpha() for p in
+                                            make_objects(points.Point, x, y)])
+            and cloud[3].distance2origin() == cloud.distance2origin()[3]):
+        print(f'{sys.argv[0]}: ERROR: PointCloud differs from Point',
+              file=sys.stderr)
+        sys.exit(1)
+
+    print("memory per point [bytes]")
+    builds = {
+        "Point": lambda n: make_objects(Point, rng.random(n), rng.random(n)),
+        "cdef Point": lambda n: make_objects(points.Point, rng.random(n),
+                                             rng.random(n)),
+        "PointCloud": lambda n: points.PointCloud(rng.random(n),
+                                                  rng.random(n)),
+    }
+    for name, build in builds.items():
+        print(f"{name:>12} {bytes_per_point(build):>8.1f}")
+
+    n_cores = os.cpu_count()
+    threads = sorted({1, n_cores})
+    columns = ["Point", "cdef Point", "numpy"] + [f"cloud {nt} thr"
+                                                   for nt in threads]
+    print(f"\nmillion points per second, {n_cores} hardware threads")
+    print(f"{'n':>6} {'method':>16} " + " ".join(f"{c:>12}" for c in columns))
+    for exp in [6, 7, 8]:
+        n = 10 ** exp
+        x, y = rng.normal(size=n), rng.normal(size=n)
+        cloud = points.PointCloud(x, y)
+        out = np.empty(n)
+        repeat = 3 if n <= 10 ** 7 else 1
+        objects = {name: make_objects(cls, x, y)
+                   for name, cls in [("Point", Point),
+                                     ("cdef Point", points.Point)]
+                   if n <= MAX_POINTS[name]}
+        numpy_funcs = {
+            "distance2origin": lambda: np.hypot(x, y, out=out),
+            "alpha": lambda: np.arcsin(y / np.hypot(x, y), out=out),
+        }
+        for method in ["distance2origin", "alpha"]:
+            t = {}
+            for name, objs in objects.items():
+                t[name] = best_time(
+                    lambda: [getattr(p, method)() for p in objs], 1)
+            if n <= MAX_POINTS["numpy"]:
+                t["numpy"] = best_time(numpy_funcs[method], repeat)
+            func = getattr(cloud, method)
+            for nt in threads:
+                t[f"cloud {nt} thr"] = best_time(
+                    lambda: func(out=out, num_threads=nt), repeat)
+            cells = " ".join(f"{n / t[c] / 1e6:>12.1f}" if c in t
+                             else f"{'-':>12}" for c in columns)
+            print(f"{n:>6.0e} {method:>16} {cells}")
+        del objects
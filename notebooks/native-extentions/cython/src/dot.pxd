@@ -0,0 +1,30 @@
+# C-level API of dot.pyx, usable from other Cython modules without the GIL:
+#
+#     from dot cimport dot_ptr
+#     with nogil:
+#         res = dot_ptr(&v[0], &w[0], n, 0)
+
+from libc.stdint cimport int32_t, int64_t
+
+ctypedef fused numeric:
+    int32_t
+    int64_t
+    float
+    double
+
+cpdef enum:
+    # below this many elements dot runs serially, starting the OpenMP team
+    # costs more than it saves
+    PARALLEL_THRESHOLD = 65536
+
+cdef enum:
+    # elements per parallel work item
+    BLOCK = 4096
+    # partial sums of the serial loop
+    LANES = 16
+
+cdef numeric dot_serial(const numeric* v, const numeric* w,
+                        Py_ssize_t n) noexcept nogil
+
+cdef numeric dot_ptr(const numeric* v, const numeric* w, Py_ssize_t n,
+                     int num_threads) noexcept nogil
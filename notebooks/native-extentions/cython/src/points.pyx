@@ -0,0 +1,194 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, initializedcheck=False, cdivision=True
+"""
+Points in 2d, one object per point and as a cloud of arrays.
+
+`Point` is the extension type from speeding_up__with_Cython.ipynb, with
+`distance2origin` and `alpha` as cpdef methods so that Python can call them.
+Every point is a Python object, so a million points are a million
+allocations and a million method calls.
+
+`PointCloud` stores the coordinates of all points in two contiguous float64
+arrays, 16 bytes per point. Its methods loop over the whole cloud in C
+without the GIL (over OpenMP threads with `num_threads`) and return arrays.
+`cloud[i]` gives a `PointView`, a small object that reads and writes point i
+of the cloud, for the occasional single-point access.
+
+Build: python setup.py build_ext --inplace
+"""
+
+from cython.parallel cimport prange
+cimport openmp
+from libc.math cimport asin, sqrt, M_PI
+
+import numpy as np
+
+
+cpdef double rad2deg(double alpha):
+    return 180 * alpha / M_PI
+
+
+cdef class Point:
+    """A point in 2d."""
+    cdef public double x, y
+
+    cpdef double distance2origin(Point self):
+        return sqrt(self.x * self.x + self.y * self.y)
+
+    cpdef double alpha(Point self):
+        return asin(self.y / self.distance2origin())
+
+    def __cinit__(self, t_x, t_y):
+        self.x = t_x
+        self.y = t_y
+
+    def __repr__(self):
+        return "(r=%.2f, alpha=%.2f°)" % (self.distance2origin(),
+                                          rad2deg(self.alpha()))
+
+
+cdef class PointView:
+    """Point i of a PointCloud, changes of x and y go to the cloud."""
+    cdef readonly PointCloud cloud
+    cdef readonly Py_ssize_t index
+
+    def __cinit__(self, PointCloud cloud, Py_ssize_t index):
+        self.cloud = cloud
+        self.index = index
+
+    @property
+    def x(self):
+        return self.cloud._x[self.index]
+
+    @x.setter
+    def x(self, double value):
+        self.cloud._x[self.index] = value
+
+    @property
+    def y(self):
+        return self.cloud._y[self.index]
+
+    @y.setter
+    def y(self, double value):
+        self.cloud._y[self.index] = value
+
+    def distance2origin(self):
+        return _distance2origin(self.cloud._x[self.index],
+                                self.cloud._y[self.index])
+
+    def alpha(self):
+        return _alpha(self.cloud._x[self.index], self.cloud._y[self.index])
+
+    def __repr__(self):
+        return "(r=%.2f, alpha=%.2f°)" % (self.distance2origin(),
+                                          rad2deg(self.alpha()))
+
+
+cdef inline double _distance2origin(double x, double y) noexcept nogil:
+    return sqrt(x * x + y * y)
+
+
+cdef inline double _alpha(double x, double y) noexcept nogil:
+    return asin(y / sqrt(x * x + y * y))
+
+
+cdef double[::1] _output(out, Py_ssize_t n):
+    """`out` checked to be a float64 array of n elements, or a new one."""
+    if out is None:
+        return np.empty(n)
+    cdef double[::1] res = out
+    if res.shape[0] != n:
+        raise ValueError(f"out has {res.shape[0]} elements, expected {n}")
+    return res
+
+
+cdef int _threads(Py_ssize_t n, int num_threads) noexcept:
+    # starting the OpenMP team costs more than it saves for small clouds
+    if n < 65536:
+        return 1
+    return num_threads if num_threads > 0 else openmp.omp_get_max_threads()
+
+
+cdef class PointCloud:
+    """n points in 2d stored as contiguous float64 arrays x and y.
+
+    The methods taking `out` write into a float64 array of n elements instead
+    of allocating one, `num_threads` = 0 uses the OpenMP default.
+    """
+    cdef readonly object x, y       # the arrays
+    cdef double[::1] _x, _y         # their memory
+
+    def __init__(self, x, y):
+        self.x = np.ascontiguousarray(x, dtype=np.float64)
+        self.y = np.ascontiguousarray(y, dtype=np.float64)
+        if self.x.ndim != 1 or self.x.shape != self.y.shape:
+            raise ValueError("x and y must be 1-d arrays of the same length")
+        self._x = self.x
+        self._y = self.y
+
+    @classmethod
+    def from_points(cls, points):
+        """The cloud of an iterable of objects with x and y attributes."""
+        points = list(points)
+        return cls([p.x for p in points], [p.y for p in points])
+
+    def __len__(self):
+        return self._x.shape[0]
+
+    def __getitem__(self, Py_ssize_t i):
+        cdef Py_ssize_t n = self._x.shape[0]
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("point index out of range")
+        return PointView(self, i)
+
+    def __repr__(self):
+        return f"PointCloud({self._x.shape[0]} points)"
+
+    def distance2origin(self, out=None, int num_threads=0):
+        """Distances of all points to the origin."""
+        cdef Py_ssize_t i, n = self._x.shape[0]
+        cdef double[::1] res = _output(out, n)
+        cdef int nt = _threads(n, num_threads)
+        for i in prange(n, nogil=True, schedule='static', num_threads=nt):
+            res[i] = _distance2origin(self._x[i], self._y[i])
+        return res.base if out is None else out
+
+    def alpha(self, out=None, int num_threads=0):
+        """asin(y / r) of all points, NaN for a point at the origin."""
+        cdef Py_ssize_t i, n = self._x.shape[0]
+        cdef double[::1] res = _output(out, n)
+        cdef int nt = _threads(n, num_threads)
+        for i in prange(n, nogil=True, schedule='static', num_threads=nt):
+            res[i] = _alpha(self._x[i], self._y[i])
+        return res.base if out is None else out
+
+    def distance_to(self, PointCloud other, out=None, int num_threads=0):
+        """Distances between point i of this cloud and point i of `other`."""
+        cdef Py_ssize_t i, n = self._x.shape[0]
+        if other._x.shape[0] != n:
+            raise ValueError(f"clouds have different sizes {n} and "
+                             f"{other._x.shape[0]}")
+        cdef double[::1] res = _output(out, n)
+        cdef int nt = _threads(n, num_threads)
+        for i in prange(n, nogil=True, schedule='static', num_threads=nt):
+            res[i] = _distance2origin(self._x[i] - other._x[i],
+                                      self._y[i] - other._y[i])
+        return res.base if out is None else out
+
+    def pairwise_distances(self, PointCloud other=None, int num_threads=0):
+        """Matrix (n, m) of the distances between all points of this cloud
+        and all m points of `other` (default: this cloud)."""
+        if other is None:
+            other = self
+        cdef Py_ssize_t i, j, n = self._x.shape[0], m = other._x.shape[0]
+        cdef double[:, ::1] res = np.empty((n, m))
+        cdef double[::1] ox = other._x, oy = other._y
+        cdef double xi, yi
+        cdef int nt = _threads(n * m, num_threads)
+        for i in prange(n, nogil=True, schedule='static', num_threads=nt):
+            xi = self._x[i]
+            yi = self._y[i]
+            for j in range(m):
+                res[i, j] = _distance2origin(xi - ox[j], yi - oy[j])
+        return res.base
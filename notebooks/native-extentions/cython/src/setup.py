@@ -0,0 +1,26 @@
+from setuptools import setup, Extension
+from Cython.Build import cythonize
+
+# python setup.py build_ext --inplace
+ext_modules = [
+    Extension(
+        'dot',
+        ['dot.pyx'],
+        extra_compile_args=['-O3', '-march=native', '-fopenmp'],
+        extra_link_args=['-fopenmp'],
+    ),
+    Extension(
+        'points',
+        ['points.pyx'],
+        extra_compile_args=['-O3', '-march=native', '-fopenmp'],
+        extra_link_args=['-fopenmp'],
+    ),
+]
+
+setup(
+    name='cython_kernels',
+    version='1.0',
+    description='OpenMP dot product and point clouds with Cython',
+    ext_modules=cythonize(ext_modules),
+    zip_safe=False,
+)
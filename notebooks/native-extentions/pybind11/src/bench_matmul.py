@@ -0,0 +1,95 @@
+"""
+Benchmark of matrix_multiply_fast (build first with
+`MARCH_NATIVE=1 python setup.py build_ext --inplace` for this machine's CPU).
+
+1. GFLOP/s of the list version from pybind11_intro.ipynb, the buffer version
+   (`matmul_into`, all cores) and NumPy's `@`, for n = 64 to 2048.
+2. Concurrent Python callers: T threads each run single-threaded multiplies,
+   with and without releasing the GIL.
+
+Run: python bench_matmul.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+import matrix_multiply_fast as mmf
+
+
+def best_time(func, repeat=3):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def concurrent_gflops(n_callers, n, calls, release_gil):
+    """Aggregate GFLOP/s of `n_callers` Python threads doing `calls`
+    single-threaded n x n multiplies each."""
+    rng = np.random.default_rng(0)
+    work = [(rng.random((n, n)), rng.random((n, n)), np.empty((n, n)))
+            for _ in range(n_callers)]
+
+    def caller(A, B, C):
+        for _ in range(calls):
+            mmf.matmul_into(A, B, C, threads=1, release_gil=release_gil)
+
+    threads = [threading.Thread(target=caller, args=w) for w in work]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return 2.0 * n ** 3 * calls * n_callers / elapsed / 1e9
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(42)
+
+    # validation
+    A = rng.random((130, 70))
+    B = rng.random((70, 90))
+    C = np.empty((130, 90))
+    mmf.matmul_into(A, B, C)
+    if not (np.allclose(C, A @ B) and
+            np.allclose(mmf.matrix_multiply(A.tolist(), B.tolist()), A @ B)):
+        print(f'{sys.argv[0]}: ERROR: results differ from NumPy',
+              file=sys.stderr)
+        sys.exit(1)
+
+    n_cores = os.cpu_count()
+    print(f"GFLOP/s, {n_cores} hardware threads")
+    print(f"{'n':>6} {'lists':>8} {'buffers':>8} {'numpy @':>8}")
+    for n in [64, 128, 256, 512, 1024, 2048]:
+        A = rng.random((n, n))
+        B = rng.random((n, n))
+        C = np.empty((n, n))
+        flop = 2.0 * n ** 3
+        repeat = 3 if n <= 512 else 1
+        if n <= 512:
+            A_list, B_list = A.tolist(), B.tolist()
+            t_list = best_time(lambda: mmf.matrix_multiply(A_list, B_list),
+                               repeat)
+            lists = f"{flop / t_list / 1e9:>8.2f}"
+        else:
+            lists = f"{'-':>8}"
+        t_buf = best_time(lambda: mmf.matmul_into(A, B, C), repeat)
+        t_np = best_time(lambda: np.matmul(A, B, out=C), repeat)
+        print(f"{n:>6} {lists} {flop / t_buf / 1e9:>8.2f} "
+              f"{flop / t_np / 1e9:>8.2f}")
+
+    n, calls = 256, 20
+    print(f"\nconcurrent Python callers, {n}x{n}, single-threaded kernel, "
+          f"aggregate GFLOP/s")
+    print(f"{'callers':>8} {'GIL released':>13} {'GIL held':>9}")
+    for n_callers in sorted({1, 2, 4, n_cores}):
+        released = concurrent_gflops(n_callers, n, calls, True)
+        held = concurrent_gflops(n_callers, n, calls, False)
+        print(f"{n_callers:>8} {released:>13.2f} {held:>9.2f}")
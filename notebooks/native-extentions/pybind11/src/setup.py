@@ -0,0 +1,28 @@
+import os
+
+from setuptools import setup, Extension
+import pybind11
+
+# python setup.py build_ext --inplace
+# MARCH_NATIVE=1 python setup.py build_ext --inplace compiles for the CPU of
+# the build machine (AVX/FMA for the register tiles), the module then fails
+# with an illegal instruction on older CPUs
+march = ['-march=native'] if os.environ.get('MARCH_NATIVE') == '1' else []
+ext_modules = [
+    Extension(
+        'matrix_multiply_fast',
+        ['matrix_multiply_fast.cpp'],
+        include_dirs=[pybind11.get_include()],
+        language='c++',
+        extra_compile_args=['-std=c++14', '-O3', '-pthread'] + march,
+        extra_link_args=['-pthread'],
+    ),
+]
+
+setup(
+    name='matrix_multiply_fast',
+    version='1.0',
+    description='Blocked, multithreaded matrix multiplication with pybind11',
+    ext_modules=ext_modules,
+    requires=['pybind11'],
+)
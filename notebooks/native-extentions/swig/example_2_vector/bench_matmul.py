@@ -0,0 +1,87 @@
+"""
+Benchmark of the SWIG matrix multiplication interfaces (build first with
+./build.sh or make).
+
+- matrix_multiply: std::vector<std::vector<double>>, every element is
+  converted from Python objects on the way in and back to a tuple of tuples
+  on the way out,
+- matrix_multiply_numpy: pointer + shape of the NumPy buffers (numpy.i), the
+  blocked OpenMP kernel writes into a preallocated array, no conversion,
+- NumPy's `@` (BLAS) as the reference.
+
+Run: python bench_matmul.py  (OMP_NUM_THREADS sets the kernel's threads)
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import benchmark
+
+
+def best_time(func, repeat=3):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def to_vector_matrix(A):
+    M = benchmark.VectorOfDoubles()
+    for row in A.tolist():
+        M.append(benchmark.DoubleVector(row))
+    return M
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(42)
+
+    # validation
+    A = rng.random((100, 70))
+    B = rng.random((70, 90))
+    C_vec = np.array(benchmark.matrix_multiply(to_vector_matrix(A),
+                                               to_vector_matrix(B)))
+    C_np = benchmark.matrix_multiply_numpy(A, B)
+    if not (np.allclose(C_vec, A @ B) and np.allclose(C_np, A @ B)):
+        print(f'{sys.argv[0]}: ERROR: results differ from NumPy',
+              file=sys.stderr)
+        sys.exit(1)
+
+    print("time in ms, GFLOP/s = 2 n^3 / time")
+    print(f"{'n':>5} | {'vector: in':>10} {'call':>9} {'GFLOP/s':>8} | "
+          f"{'numpy.i call':>12} {'GFLOP/s':>8} | {'BLAS':>9} {'GFLOP/s':>8}")
+    for n in [64, 128, 256, 512, 1024, 2048]:
+        A = rng.random((n, n))
+        B = rng.random((n, n))
+        C = np.empty((n, n))
+        flop = 2.0 * n ** 3
+        repeat = 3 if n <= 512 else 1
+
+        if n <= 1024:
+            t_in = best_time(lambda: (to_vector_matrix(A),
+                                      to_vector_matrix(B)), repeat)
+            A_vec, B_vec = to_vector_matrix(A), to_vector_matrix(B)
+            t_vec = best_time(lambda: benchmark.matrix_multiply(A_vec, B_vec),
+                              repeat)
+            vec = (f"{1e3 * t_in:>10.2f} {1e3 * t_vec:>9.2f} "
+                   f"{flop / (t_in + t_vec) / 1e9:>8.2f}")
+        else:
+            vec = f"{'-':>10} {'-':>9} {'-':>8}"
+
+        t_np = best_time(lambda: benchmark.matrix_multiply_blocked(A, B, C),
+                         repeat)
+        t_blas = best_time(lambda: np.matmul(A, B, out=C), repeat)
+        print(f"{n:>5} | {vec} | {1e3 * t_np:>12.2f} {flop / t_np / 1e9:>8.2f} "
+              f"| {1e3 * t_blas:>9.2f} {flop / t_blas / 1e9:>8.2f}")
+
+    # call overhead of the two interfaces on tiny matrices
+    A1, C1 = np.ones((1, 1)), np.empty((1, 1))
+    t_vec = best_time(lambda: benchmark.matrix_multiply(A1.tolist(),
+                                                        A1.tolist()), 1000)
+    t_np = best_time(lambda: benchmark.matrix_multiply_blocked(A1, A1, C1),
+                     1000)
+    print(f"\ncall overhead (1x1): vector {1e6 * t_vec:.2f} us, "
+          f"numpy.i {1e6 * t_np:.2f} us")
@@ -0,0 +1,93 @@
+"""
+Benchmark of the std::vector and the NumPy buffer versions of `half`,
+`halve_in_place` and `average` (build first with ./build.sh or make).
+
+For a NumPy array the vector versions convert it to a vector (list) and the
+result back; the buffer versions (`*_numpy`) pass the array memory. Times are
+per call in microseconds, GB/s is the float64 bytes read by average_numpy.
+
+Run: python bench_vector.py
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import example
+
+
+def best_time(func, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def half_vector(a):
+    return np.array(example.half(a.tolist()))
+
+
+def halve_in_place_vector(a):
+    v = example.DoubleVector(a.tolist())
+    example.halve_in_place(v)
+    a[:] = v
+
+
+def average_vector(a):
+    # average() takes std::vector<int>, floats are truncated: timing only
+    return example.average(a.astype(int).tolist())
+
+
+if __name__ == '__main__':
+    # validation
+    a = np.arange(1000, dtype=np.float64)
+    for dtype in [np.float32, np.float64]:
+        b = a.astype(dtype)
+        example.halve_in_place_numpy(b)
+        if not (np.array_equal(example.half_numpy(a.astype(dtype)), a / 2)
+                and np.array_equal(b, a / 2)
+                and example.average_numpy(a.astype(dtype)) == a.mean()):
+            print(f'{sys.argv[0]}: ERROR: buffer versions give wrong results',
+                  file=sys.stderr)
+            sys.exit(1)
+
+    print(f"{'n':>6} | {'half':^29} | {'halve_in_place':^29} | "
+          f"{'average':^19}")
+    print(f"{'':>6} | {'vector':>9} {'f64':>9} {'f32':>9} | {'vector':>9} "
+          f"{'f64':>9} {'f32':>9} | {'vector':>9} {'f64':>9} | "
+          f"{'GB/s':>8}")
+    for exp in range(1, 9):
+        n = 10 ** exp
+        a64 = np.random.rand(n)
+        a32 = a64.astype(np.float32)
+        out64, out32 = np.empty_like(a64), np.empty_like(a32)
+        repeat = max(3, min(1000, 10 ** 6 // n))
+
+        t = {}
+        t["half f64"] = best_time(lambda: example.half_numpy(a64, out64),
+                                  repeat)
+        t["half f32"] = best_time(lambda: example.half_numpy(a32, out32),
+                                  repeat)
+        t["inplace f64"] = best_time(lambda: example.halve_in_place_numpy(a64),
+                                     repeat)
+        t["inplace f32"] = best_time(lambda: example.halve_in_place_numpy(a32),
+                                     repeat)
+        t["average f64"] = best_time(lambda: example.average_numpy(a64),
+                                     repeat)
+        if n <= 10 ** 7:    # 10^8 Python floats do not fit in memory
+            rep = max(1, repeat // 10)
+            t["half vec"] = best_time(lambda: half_vector(a64), rep)
+            t["inplace vec"] = best_time(lambda: halve_in_place_vector(a64),
+                                         rep)
+            t["average vec"] = best_time(lambda: average_vector(a64), rep)
+
+        us = {k: f"{1e6 * v:9.2f}" for k, v in t.items()}
+        gbs = 8 * n / t["average f64"] / 1e9
+        print(f"{n:>6.0e} | {us.get('half vec', '-'):>9} {us['half f64']} "
+              f"{us['half f32']} | {us.get('inplace vec', '-'):>9} "
+              f"{us['inplace f64']} {us['inplace f32']} | "
+              f"{us.get('average vec', '-'):>9} {us['average f64']} | "
+              f"{gbs:>8.2f}")
@@ -4,6 +4,8 @@
 #include <cmath>
 #include <numeric>
 #include <algorithm>
+#include <functional>
+#include <stdexcept>
 
 // Matrix-matrix multiplication (C = A * B)
 // A: m x n matrix, B: n x p matrix, Result: m x p matrix
@@ -34,3 +36,50 @@ std::vector<std::vector<double>> matrix_multiply(const std::vector<std::vector<d
     
     return C;
 }
+
+// Matrix-matrix multiplication on NumPy buffers (C = A * B)
+// A: m x n, B: nb x p, C: mc x pc, all contiguous row-major, C preallocated
+// and not overlapping A or B.
+// The loops are blocked over (i, k, j) so that a BK x BJ tile of B stays in
+// cache while it is reused for BI rows of A, and the innermost loop runs
+// along rows of B and C (unit stride, vectorized). Row blocks of C are
+// distributed over OpenMP threads when compiled with -fopenmp.
+void matrix_multiply_blocked(double* A, int m, int n,
+                             double* B, int nb, int p,
+                             double* C, int mc, int pc) {
+    if (nb != n || mc != m || pc != p) {
+        throw std::invalid_argument("Matrix dimensions incompatible for multiplication");
+    }
+    // C is zeroed before A and B are read, it must not share memory with them
+    auto overlaps_C = [C, m, p](const double* X, size_t size) {
+        std::less<const double*> less;
+        return less(X, C + (size_t)m * p) && less(C, X + size);
+    };
+    if (overlaps_C(A, (size_t)m * n) || overlaps_C(B, (size_t)n * p)) {
+        throw std::invalid_argument("C must not overlap A or B");
+    }
+    const int BI = 64, BK = 128, BJ = 256;
+
+    #pragma omp parallel for schedule(static)
+    for (int ii = 0; ii < m; ii += BI) {
+        int i1 = std::min(ii + BI, m);
+        std::fill(C + (size_t)ii * p, C + (size_t)i1 * p, 0.0);
+        for (int kk = 0; kk < n; kk += BK) {
+            int k1 = std::min(kk + BK, n);
+            for (int jj = 0; jj < p; jj += BJ) {
+                int j1 = std::min(jj + BJ, p);
+                for (int i = ii; i < i1; i++) {
+                    const double* a = A + (size_t)i * n;
+                    double* c = C + (size_t)i * p;
+                    for (int k = kk; k < k1; k++) {
+                        const double aik = a[k];
+                        const double* b = B + (size_t)k * p;
+                        for (int j = jj; j < j1; j++) {
+                            c[j] += aik * b[j];
+                        }
+                    }
+                }
+            }
+        }
+    }
+}
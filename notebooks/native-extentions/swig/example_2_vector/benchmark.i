@@ -2,10 +2,18 @@
 %module benchmark
 
 %{
+#define SWIG_FILE_WITH_INIT
+#include <string>
 #include "benchmark.h"
 %}
 
 %include "std_vector.i"
+%include "exception.i"
+%include "numpy.i"
+
+%init %{
+import_array();
+%}
 
 /* Instantiate vector templates */
 namespace std {
@@ -13,4 +21,47 @@ namespace std {
     %template(VectorOfDoubles) vector<std::vector<double>>;
 }
 
+/* Turn C++ exceptions into Python exceptions */
+%exception {
+    try {
+        $action
+    } catch (const std::invalid_argument& e) {
+        SWIG_exception(SWIG_ValueError, e.what());
+    }
+}
+
+/* The NumPy version runs without the GIL, the error is raised after it is
+   taken back */
+%exception matrix_multiply_blocked {
+    std::string error;
+    Py_BEGIN_ALLOW_THREADS
+    try {
+        $action
+    } catch (const std::invalid_argument& e) {
+        error = e.what();
+    }
+    Py_END_ALLOW_THREADS
+    if (!error.empty()) {
+        SWIG_exception(SWIG_ValueError, error.c_str());
+    }
+}
+
+/* NumPy arrays are passed as pointer + shape: A and B without a copy when
+   they are C-contiguous float64, C has to be and is written in place */
+%apply (double* IN_ARRAY2, int DIM1, int DIM2) {(double* A, int m, int n),
+                                                (double* B, int nb, int p)};
+%apply (double* INPLACE_ARRAY2, int DIM1, int DIM2) {(double* C, int mc, int pc)};
+
 %include "benchmark.h"
+
+%pythoncode %{
+def matrix_multiply_numpy(A, B, out=None):
+    """C = A @ B with the blocked kernel, written into `out` if given."""
+    import numpy as np
+    A = np.ascontiguousarray(A, dtype=np.float64)
+    B = np.ascontiguousarray(B, dtype=np.float64)
+    if out is None:
+        out = np.empty((A.shape[0], B.shape[1]))
+    matrix_multiply_blocked(A, B, out)
+    return out
+%}
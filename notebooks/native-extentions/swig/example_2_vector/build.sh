@@ -3,11 +3,36 @@
 # Get Python include and library paths dynamically
 PYTHON_INCLUDE=$(python3-config --includes)
 PYTHON_LIBS=$(python3-config --ldflags)
+NUMPY_INCLUDE=-I$(python3 -c "import numpy; print(numpy.get_include())")
 
 echo "Python includes: $PYTHON_INCLUDE"
 echo "Python libs: $PYTHON_LIBS"
+echo "NumPy includes: $NUMPY_INCLUDE"
 echo ""
 
+# numpy.i (SWIG typemaps for NumPy arrays) is not installed with NumPy wheels.
+# Use a copy in this directory, the file given in NUMPY_I or the one of a
+# NumPy source install; download the one matching the installed version only
+# with FETCH_NUMPY_I=1
+if [ ! -f numpy.i ]; then
+    NUMPY_I_INSTALLED=$(python3 -c "import numpy, os; print(os.path.join(os.path.dirname(numpy.__file__), 'tools', 'swig', 'numpy.i'))")
+    if [ -n "$NUMPY_I" ]; then
+        cp "$NUMPY_I" numpy.i || exit 1
+    elif [ -f "$NUMPY_I_INSTALLED" ]; then
+        cp "$NUMPY_I_INSTALLED" numpy.i
+    elif [ "$FETCH_NUMPY_I" = 1 ]; then
+        NUMPY_VERSION=$(python3 -c "import numpy; print(numpy.__version__)")
+        echo "Fetching numpy.i for NumPy $NUMPY_VERSION..."
+        curl -sSfL -o numpy.i \
+            "https://raw.githubusercontent.com/numpy/numpy/v$NUMPY_VERSION/tools/swig/numpy.i" \
+            || { echo "Could not download numpy.i"; rm -f numpy.i; exit 1; }
+    else
+        echo "numpy.i not found: copy it here, set NUMPY_I=/path/to/numpy.i"
+        echo "or download it with FETCH_NUMPY_I=1 ./build.sh"
+        exit 1
+    fi
+fi
+
 # Generate SWIG wrappers
 echo "Generating wrapper code with SWIG..."
 swig -c++ -python example.i
@@ -15,13 +40,13 @@ swig -c++ -python benchmark.i
 
 # Compile the SWIG wrappers
 echo "Compiling wrappers..."
-g++ -O2 -fPIC -c example_wrap.cxx $PYTHON_INCLUDE
-g++ -O2 -fPIC -c benchmark_wrap.cxx $PYTHON_INCLUDE
+g++ -O2 -fPIC -c example_wrap.cxx $PYTHON_INCLUDE $NUMPY_INCLUDE
+g++ -O3 -fopenmp -fPIC -c benchmark_wrap.cxx $PYTHON_INCLUDE $NUMPY_INCLUDE
 
 # Link to create the shared libraries
 echo "Linking shared libraries..."
 g++ -shared example_wrap.o -o _example.so $PYTHON_LIBS
-g++ -shared benchmark_wrap.o -o _benchmark.so $PYTHON_LIBS
+g++ -shared -fopenmp benchmark_wrap.o -o _benchmark.so $PYTHON_LIBS
 
 echo ""
 echo "✓ Build complete!"
@@ -4,6 +4,7 @@
 #include <algorithm>
 #include <functional>
 #include <numeric>
+#include <stdexcept>
 
 double average(std::vector<int> v) {
     return std::accumulate(v.begin(),v.end(),0.0)/v.size();
@@ -22,4 +23,28 @@ void halve_in_place(std::vector<double>& v) {
                    std::bind2nd(std::divides<double>(),2.0));
 }
 
+// Buffer versions of the functions above for NumPy arrays (see example.i):
+// they work on the array memory directly, without copying it into a vector,
+// and are instantiated for float and double.
 
+template <typename T>
+double average_array(T* v, int n) {
+    double sum = 0.0;
+    for (int i = 0; i < n; i++)
+        sum += v[i];
+    return sum / n;
+}
+
+template <typename T>
+void half_array(T* v, int n, T* out, int n_out) {
+    if (n != n_out)
+        throw std::invalid_argument("input and output sizes differ");
+    for (int i = 0; i < n; i++)
+        out[i] = v[i] / 2;
+}
+
+template <typename T>
+void halve_in_place_array(T* v, int n) {
+    for (int i = 0; i < n; i++)
+        v[i] /= 2;
+}
@@ -2,16 +2,94 @@
 %module example
 
 %{
+#define SWIG_FILE_WITH_INIT
+#include <string>
 #include "example.h"
 %}
 
 %include "std_vector.i"
+%include "exception.i"
+%include "numpy.i"
+
+%init %{
+import_array();
+%}
+
 /* instantiate the required template specializations */
 namespace std {
     %template(IntVector)    vector<int>;
     %template(DoubleVector) vector<double>;
 }
 
+/* The functions run without the GIL (the arguments are converted before),
+   errors are raised after it is taken back */
+%exception {
+    std::string error;
+    Py_BEGIN_ALLOW_THREADS
+    try {
+        $action
+    } catch (const std::invalid_argument& e) {
+        error = e.what();
+    }
+    Py_END_ALLOW_THREADS
+    if (!error.empty()) {
+        SWIG_exception(SWIG_ValueError, error.c_str());
+    }
+}
+
+/* NumPy arrays are passed as pointer + length: inputs without a copy when
+   they are contiguous and of the right dtype, in-place arguments have to be */
+%apply (float* IN_ARRAY1, int DIM1) {(float* v, int n)};
+%apply (double* IN_ARRAY1, int DIM1) {(double* v, int n)};
+%apply (float* INPLACE_ARRAY1, int DIM1) {(float* out, int n_out)};
+%apply (double* INPLACE_ARRAY1, int DIM1) {(double* out, int n_out)};
+
 /* Let's just grab the original header file here */
 %include "example.h"
 
+%template(average_array_float)  average_array<float>;
+%template(average_array_double) average_array<double>;
+%template(half_array_float)     half_array<float>;
+%template(half_array_double)    half_array<double>;
+
+/* the in-place argument has the same name as the inputs */
+%clear (float* v, int n), (double* v, int n);
+%apply (float* INPLACE_ARRAY1, int DIM1) {(float* v, int n)};
+%apply (double* INPLACE_ARRAY1, int DIM1) {(double* v, int n)};
+%template(halve_in_place_array_float)  halve_in_place_array<float>;
+%template(halve_in_place_array_double) halve_in_place_array<double>;
+
+%pythoncode %{
+def _typed(name, v):
+    """The float32 or float64 instantiation of `name` for the array `v`."""
+    try:
+        return _TYPED[name, v.dtype.char]
+    except (KeyError, AttributeError):
+        raise TypeError(f"{name}: float32 or float64 array expected, "
+                        f"got {getattr(v, 'dtype', type(v).__name__)}")
+
+
+def average_numpy(v):
+    """average() of a float32/float64 NumPy array."""
+    return _typed("average_array", v)(v)
+
+
+def half_numpy(v, out=None):
+    """half() of a float32/float64 NumPy array, written into `out` if given."""
+    if out is None:
+        import numpy as np
+        out = np.empty_like(v)
+    _typed("half_array", v)(v, out)
+    return out
+
+
+def halve_in_place_numpy(v):
+    """halve_in_place() on the memory of a contiguous NumPy array."""
+    _typed("halve_in_place_array", v)(v)
+
+
+# (function, dtype.char) -> instantiation
+_TYPED = {(name, char): globals()[name + suffix]
+          for name in ("average_array", "half_array", "halve_in_place_array")
+          for char, suffix in (("f", "_float"), ("d", "_double"))}
+%}
@@ -2,28 +2,20 @@ import math
 import numba
 import numba.cuda as cuda
 import numpy as np
+import os
 import sys
 from timing import time_region, time_region_cuda
 
+# the CPU kernel gemv_v1 lives in numba/src/kernels.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'numba', 'src'))
+from kernels import gemv_v1  # noqa: E402
+
 
 def print_usage():
     print(f'Usage: {sys.argv[0]} <arraydim> <version>', file=sys.stderr)
 
 
-@numba.njit(cache=True, parallel=True)
-def gemv_v1(alpha, A, x, beta, y):
-    N, M = A.shape
-    y_ret = np.empty(N)
-    for i in numba.prange(N):
-        prod = 0.0
-        for j in numba.prange(M):
-            prod += A[i, j]*x[j]
-
-        y_ret[i] = alpha*prod + beta*y[i]
-
-    return y_ret
-
-
 def gemv_v2(alpha, A, x, beta, y):
     return alpha*(A @ x) + beta*y
 
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Size-aware dispatch between the `cpu` and `parallel` targets of a ufunc.
+
+`numba_vectorize.ipynb` shows that `target="parallel"` is slower than the
+default target for 10^6 elements and faster for 10^8: below some size the
+thread start-up and synchronization cost more than the work. The crossover
+depends on the function, the argument types, the machine and the number of
+threads.
+
+`size_dispatch` compiles a function for both targets. On the first call with
+a new combination of argument dtypes it measures both ufuncs on growing
+inputs built from the call's arguments, stores the smallest size above which
+`parallel` stays faster, and routes every call by its (broadcast) size. The
+crossovers are kept in a JSON file next to the Numba cache, so the
+measurement is done once per machine and thread count.
+
+Run `python dispatch.py` for the benchmark of `sinacosb` and `escape_time`.
+"""
+
+import json
+import math
+import os
+from time import perf_counter
+
+import numba
+import numpy as np
+
+CROSSOVER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              "__pycache__", "ufunc_crossover.json")
+
+
+def _best_time(func, repeat=3):
+    best = math.inf
+    for _ in range(repeat):
+        t0 = perf_counter()
+        func()
+        best = min(best, perf_counter() - t0)
+    return best
+
+
+class SizeDispatchUfunc:
+    """
+    Ufunc compiled for the `cpu` and `parallel` targets, calls go to
+    `parallel` from the measured crossover size on.
+
+    Parameters
+    ----------
+    func : callable
+        scalar function as for `numba.vectorize`
+    signatures : list of str
+        eager signatures, e.g. ['f8(f8,f8)']
+    cache_file : str or None
+        JSON file with the measured crossovers, None to keep them in memory
+    min_size, max_size : int
+        range of sizes tried for the crossover
+    max_time : float
+        stop growing the size once a call of the cpu ufunc takes longer [s]
+    """
+
+    def __init__(self, func, signatures, cache_file=CROSSOVER_FILE,
+                 min_size=100, max_size=10 ** 7, max_time=0.1):
+        self.name = f"{func.__module__}.{func.__qualname__}"
+        self.cpu = numba.vectorize(signatures, nopython=True,
+                                   cache=True)(func)
+        self.parallel = numba.vectorize(signatures, nopython=True,
+                                        target="parallel", cache=True)(func)
+        self.cache_file = cache_file
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_time = max_time
+        # "dtypes|threads" -> crossover size (None: never parallel), as stored
+        self.crossover = self._load().get(self.name, {})
+        self._routes = {}   # (dtypes, threads) -> crossover, for __call__
+
+    def _load(self):
+        if self.cache_file is None or not os.path.exists(self.cache_file):
+            return {}
+        with open(self.cache_file) as f:
+            return json.load(f)
+
+    def _save(self):
+        if self.cache_file is None:
+            return
+        data = self._load()
+        data[self.name] = self.crossover
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        tmp = self.cache_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self.cache_file)
+
+    def calibrate(self, *args):
+        """
+        Measure both targets on inputs of growing size, built by repeating
+        the flattened `args` (scalars stay scalars). Returns the crossover
+        size, math.inf if `parallel` never wins.
+        """
+        sizes, faster = [], []
+        n = self.min_size
+        while n <= self.max_size:
+            inputs = [np.resize(np.asarray(a).ravel(), n) if np.ndim(a) else a
+                      for a in args]
+            self.cpu(*inputs)
+            self.parallel(*inputs)
+            repeat = min(100, max(3, 10 ** 5 // n))
+            t_cpu = _best_time(lambda: self.cpu(*inputs), repeat)
+            t_par = _best_time(lambda: self.parallel(*inputs), repeat)
+            sizes.append(n)
+            faster.append(t_par < 0.95 * t_cpu)   # ties go to cpu
+            if t_cpu > self.max_time:
+                break
+            n *= 4
+        crossover = math.inf
+        for n, par in zip(reversed(sizes), reversed(faster)):
+            if not par:
+                break
+            crossover = n
+        return crossover
+
+    def crossover_for(self, *args):
+        """Crossover size for the dtypes of `args`, measured if unknown."""
+        dtypes = tuple(a.dtype if isinstance(a, np.ndarray)
+                       else np.asarray(a).dtype for a in args)
+        threads = numba.get_num_threads()
+        route = self._routes.get((dtypes, threads))
+        if route is not None:
+            return route
+        key = ",".join(d.str for d in dtypes) + f"|{threads}"
+        if key not in self.crossover:
+            n = self.calibrate(*args) if threads > 1 else math.inf
+            self.crossover[key] = None if math.isinf(n) else n
+            self._save()
+        n = self.crossover[key]
+        route = self._routes[dtypes, threads] = math.inf if n is None else n
+        return route
+
+    def __call__(self, *args, **kwargs):
+        # largest argument, the broadcast size for the usual elementwise call
+        size = max(a.size if isinstance(a, np.ndarray) else 1 for a in args)
+        if size >= self.crossover_for(*args):
+            return self.parallel(*args, **kwargs)
+        return self.cpu(*args, **kwargs)
+
+
+def size_dispatch(signatures, **kwargs):
+    """Decorator version of `SizeDispatchUfunc`."""
+    def wrap(func):
+        return SizeDispatchUfunc(func, signatures, **kwargs)
+    return wrap
+
+
+if __name__ == '__main__':
+    from kernels import UFUNC_SIGNATURES, sinacosb
+    from mandelbrot import escape_time
+
+    sinacosb_auto = SizeDispatchUfunc(sinacosb, UFUNC_SIGNATURES)
+    escape_time_auto = SizeDispatchUfunc(escape_time, ['i8(c16,i8)'])
+
+    def arguments(name, n):
+        if name == "sinacosb":
+            a = np.ones(n, dtype='int8')        # as in the notebook
+            return a, 2 * a
+        # points on a line through the boundary of the Mandelbrot set
+        return np.linspace(-2.2, 1.0, n) + 0.3j, 50
+
+    nthreads = numba.get_num_threads()
+    print(f"time per element [ns], {nthreads} threads")
+    # escape_time is ~10x costlier per element, 10^7 already takes seconds
+    for name, auto, max_exp in [("sinacosb", sinacosb_auto, 8),
+                                ("escape_time", escape_time_auto, 7)]:
+        args = arguments(name, 1000)
+        crossover = auto.crossover_for(*args)
+        print(f"\n{name}: crossover {crossover} elements")
+        print(f"{'size':>8} {'cpu':>8} {'parallel':>9} {'dispatch':>9} "
+              f"{'best':>9} {'dispatch/best':>14}")
+        for exp in range(2, max_exp + 1):
+            n = 10 ** exp
+            args = arguments(name, n)
+            repeat = max(1, min(100, 10 ** 7 // n))
+            times = [_best_time(lambda: f(*args), repeat) / n * 1e9
+                     for f in (auto.cpu, auto.parallel, auto)]
+            best = min(times[:2])
+            winner = "cpu" if times[0] <= times[1] else "parallel"
+            print(f"{n:>8.0e} {times[0]:>8.3f} {times[1]:>9.3f} "
+                  f"{times[2]:>9.3f} {winner:>9} {times[2] / best:>14.2f}")
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Kernels of `euclidean-distance-matrix-numba.ipynb`, `numba_vectorize.ipynb`
+and `numba_fix_seed.ipynb` as an importable module, cached on disk and
+declared for `warmup.py`. `gemv_v1` is the CPU kernel of
+`numba-cuda/src/matvec.py`, defined here so that it can be imported without
+initializing numba.cuda. matvec.py and `bench_bindings.py` import it.
+
+Run `python kernels.py` to check them against NumPy.
+"""
+
+import math
+
+import numba
+import numpy as np
+from numba.extending import register_jitable
+
+from warmup import declare, lookup, register
+
+UFUNC_SIGNATURES = ['f8(i8,i8)', 'f4(f4,f4)', 'f8(f8,f8)']
+
+
+@declare("(float64[:, ::1], float64[:, ::1])")
+@numba.njit(parallel=True, cache=True)
+def euclidean_numba_prange(x, y):
+    """Implementation with numba using prange in inner loop."""
+
+    nrows, ncols = x.shape
+    dist_matrix = np.zeros((nrows, nrows))
+    for i in range(nrows):
+        for j in range(nrows):
+            r = 0.0
+            for k in numba.prange(ncols):
+                r += (x[i][k] - y[j][k])**2
+            dist_matrix[i][j] = r
+
+    return dist_matrix
+
+
+@declare("(float64[:, ::1], float64[:, ::1])")
+@numba.njit(parallel=True, cache=True)
+def euclidean_numba_vectorized(x, y):
+    """Implementation with numba using vectorized numpy operations."""
+
+    nrows, ncols = x.shape
+    dist_matrix = np.zeros((nrows, nrows))
+    for i in range(nrows):
+        for j in numba.prange(nrows):
+            dist_matrix[i][j] = ((x[i] - y[j])**2).sum()
+
+    return dist_matrix
+
+
+def euclidean_numpy(x, y):
+    """Euclidean square distance matrix, NumPy reference."""
+    x2 = np.einsum('ij,ij->i', x, x)[:, np.newaxis]
+    y2 = np.einsum('ij,ij->i', y, y)[:, np.newaxis].T
+    xy = np.dot(x, y.T)
+    return np.abs(x2 + y2 - 2. * xy)
+
+
+@declare("(float64, float64[:, ::1], float64[::1], float64, float64[::1])",
+         "(float64, float64[::1, :], float64[::1], float64, float64[::1])")
+@numba.njit(cache=True, parallel=True)
+def gemv_v1(alpha, A, x, beta, y):
+    N, M = A.shape
+    y_ret = np.empty(N)
+    for i in numba.prange(N):
+        prod = 0.0
+        for j in numba.prange(M):
+            prod += A[i, j]*x[j]
+
+        y_ret[i] = alpha*prod + beta*y[i]
+
+    return y_ret
+
+
+def sinacosb(a, b):
+    """Calculate the product of sin(a) and cos(b)"""
+    return math.sin(a) * math.cos(b)
+
+
+# Eager ufuncs. Numba caches their kernels but not the ufunc loops, which
+# take ~0.5 s to build on every import, so they are built on first access.
+_UFUNC_OPTIONS = {"sinacosb_numba_eager": dict(),
+                  "sinacosb_numba_parallel": dict(target="parallel")}
+for _name in _UFUNC_OPTIONS:
+    register(__name__, _name)
+
+
+def __getattr__(name):
+    if name not in _UFUNC_OPTIONS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    ufunc = numba.vectorize(UFUNC_SIGNATURES, nopython=True, cache=True,
+                            **_UFUNC_OPTIONS[name])(sinacosb)
+    globals()[name] = ufunc
+    return ufunc
+
+
+@register_jitable
+def set_seed_compact(x):
+    """Set the random seed in a way that works in JIT-compiled functions."""
+    np.random.seed(x)
+
+
+@declare("()")
+@numba.njit(cache=True)
+def get_random():
+    """Generate random numbers using the JIT random state."""
+    return np.random.rand(3)
+
+
+@declare("(int64,)")
+@numba.njit(cache=True)
+def initialize_seed(seed):
+    set_seed_compact(seed)
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng()
+    x = 10. * rng.random((100, 10))
+    ref = euclidean_numpy(x, x)
+    print("Max diff numpy vs prange:",
+          np.abs(ref - euclidean_numba_prange(x, x)).max())
+    print("Max diff numpy vs vectorized:",
+          np.abs(ref - euclidean_numba_vectorized(x, x)).max())
+
+    a = np.ones(1000, dtype='int8')
+    b = 2 * a
+    ref = np.sin(a) * np.cos(b)
+    eager = lookup(__name__, "sinacosb_numba_eager")
+    parallel = lookup(__name__, "sinacosb_numba_parallel")
+    print("Max diff sinacosb eager, parallel:",
+          np.abs(ref - eager(a, b)).max(), np.abs(ref - parallel(a, b)).max())
+
+    A = rng.random((200, 100))
+    v, w = rng.random(100), rng.random(200)
+    print("Max diff gemv_v1 C, F order:",
+          np.abs(0.2 * A @ v + w - gemv_v1(0.2, A, v, 1.0, w)).max(),
+          np.abs(0.2 * A @ v + w
+                 - gemv_v1(0.2, np.asfortranarray(A), v, 1.0, w)).max())
+
+    initialize_seed(42)
+    first = get_random()
+    initialize_seed(42)
+    print("Reproducible seed:", np.array_equal(first, get_random()))
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Reproducible random streams for parallel Numba kernels.
+
+`numba_fix_seed.ipynb` seeds Numba's global generator with
+`initialize_seed`, which makes serial code reproducible. Inside `prange` the
+threads draw from per-thread generators, so which numbers an iteration gets
+depends on the schedule and the number of threads.
+
+This module implements the counter-based generator Philox4x32-10 (Salmon et
+al., "Parallel random numbers: as easy as 1, 2, 3", SC'11). The random
+numbers are a pure function of (seed, stream, counter):
+
+- every block of a `prange` loop opens its own stream, `stream_state(seed, b)`,
+  and draws from it with `next_uniform` / `next_normal`,
+- streams are independent and need no communication between threads,
+- `uniform_at(seed, stream, i)` gives the i-th number of a stream directly and
+  `skip` jumps ahead, so the result of a block does not depend on the blocks
+  before it.
+
+Results are identical for any number of threads as long as the partial
+results of the blocks are combined in a fixed order (see `mc_pi_parallel`).
+
+Run `python rng.py` for the Random123 test vectors and samples/s against the
+serial seeded approach.
+"""
+
+import math
+import sys
+from time import perf_counter
+
+import numba
+import numpy as np
+from numba.extending import register_jitable
+
+# Philox4x32 multipliers and Weyl key increments
+M0 = np.uint64(0xD2511F53)
+M1 = np.uint64(0xCD9E8D57)
+W0 = np.uint64(0x9E3779B9)
+W1 = np.uint64(0xBB67AE85)
+MASK32 = np.uint64(0xFFFFFFFF)
+SHIFT32 = np.uint64(32)
+ROUNDS = 10
+
+# layout of a stream state, a uint64 array
+KEY, STREAM, COUNTER, CACHED, CACHE = range(5)
+STATE_SIZE = 5
+
+TWO53 = 9007199254740992.0
+
+
+@numba.njit(inline="always")
+def philox4x32(c0, c1, c2, c3, k0, k1):
+    """Philox4x32-10 of counter (c0, c1, c2, c3) under key (k0, k1), all
+    32-bit words held in uint64."""
+    for r in range(ROUNDS):
+        p0 = M0 * c0
+        p1 = M1 * c2
+        c0, c1, c2, c3 = ((p1 >> SHIFT32) ^ c1 ^ k0, p1 & MASK32,
+                          (p0 >> SHIFT32) ^ c3 ^ k1, p0 & MASK32)
+        k0 = (k0 + W0) & MASK32
+        k1 = (k1 + W1) & MASK32
+    return c0, c1, c2, c3
+
+
+@numba.njit(inline="always")
+def _block(key, stream, block):
+    """Two 53-bit integers, the uniforms 2*block and 2*block + 1."""
+    x0, x1, x2, x3 = philox4x32(block & MASK32, block >> SHIFT32,
+                                stream & MASK32, stream >> SHIFT32,
+                                key & MASK32, key >> SHIFT32)
+    return ((x0 >> np.uint64(5)) << np.uint64(26)) | (x1 >> np.uint64(6)), \
+        ((x2 >> np.uint64(5)) << np.uint64(26)) | (x3 >> np.uint64(6))
+
+
+@register_jitable
+def stream_state(seed, stream):
+    """State of stream `stream` of generator `seed`, positioned at 0."""
+    state = np.zeros(STATE_SIZE, dtype=np.uint64)
+    state[KEY] = np.uint64(seed)
+    state[STREAM] = np.uint64(stream)
+    return state
+
+
+@register_jitable
+def skip(state, n):
+    """Jump `n` numbers ahead."""
+    state[COUNTER] += np.uint64(n)
+    state[CACHED] = 0
+
+
+@register_jitable
+def next_uniform(state):
+    """Next double in [0, 1) of the stream; one Philox call per two."""
+    i = state[COUNTER]
+    state[COUNTER] = i + np.uint64(1)
+    if i & np.uint64(1):
+        if state[CACHED]:
+            state[CACHED] = 0
+            return state[CACHE] / TWO53
+        return _block(state[KEY], state[STREAM], i >> np.uint64(1))[1] / TWO53
+    a, b = _block(state[KEY], state[STREAM], i >> np.uint64(1))
+    state[CACHE] = b
+    state[CACHED] = 1
+    return a / TWO53
+
+
+@register_jitable
+def next_normal(state):
+    """Next standard normal deviate (Box-Muller, consumes two uniforms)."""
+    u1 = next_uniform(state)
+    u2 = next_uniform(state)
+    return math.sqrt(-2.0 * math.log(1.0 - u1)) * math.cos(2.0 * math.pi * u2)
+
+
+@numba.njit(cache=True)
+def uniform_at(seed, stream, i):
+    """The i-th uniform of a stream, without generating the ones before."""
+    pair = _block(np.uint64(seed), np.uint64(stream),
+                  np.uint64(i) >> np.uint64(1))
+    return pair[i & 1] / TWO53
+
+
+@numba.njit(parallel=True, cache=True)
+def uniform(seed, n, block=4096):
+    """n uniforms, block b of `block` numbers from stream b (any thread)."""
+    out = np.empty(n)
+    nblocks = (n + block - 1) // block
+    for b in numba.prange(nblocks):
+        state = stream_state(seed, b)
+        for i in range(b * block, min(n, (b + 1) * block)):
+            out[i] = next_uniform(state)
+    return out
+
+
+@numba.njit(parallel=True, cache=True)
+def normal(seed, n, block=4096):
+    """n standard normal deviates, as `uniform`."""
+    out = np.empty(n)
+    nblocks = (n + block - 1) // block
+    for b in numba.prange(nblocks):
+        state = stream_state(seed, b)
+        for i in range(b * block, min(n, (b + 1) * block)):
+            out[i] = next_normal(state)
+    return out
+
+
+# Monte Carlo estimate of pi, the example for the benchmark
+@register_jitable
+def set_seed_compact(x):
+    """Set the random seed in a way that works in JIT-compiled functions."""
+    np.random.seed(x)
+
+
+@numba.njit(cache=True)
+def mc_pi_serial(seed, n):
+    """Notebook approach: seed Numba's global generator, draw serially."""
+    set_seed_compact(seed)
+    hits = 0
+    for i in range(n):
+        x = np.random.random()
+        y = np.random.random()
+        if x * x + y * y < 1.0:
+            hits += 1
+    return 4.0 * hits / n
+
+
+@numba.njit(parallel=True, cache=True)
+def mc_pi_parallel(seed, n, block=65536):
+    """Parallel version with one Philox stream per block; the block counts
+    are summed in order, so the result does not depend on the threads."""
+    nblocks = (n + block - 1) // block
+    hits = np.zeros(nblocks, dtype=np.int64)
+    for b in numba.prange(nblocks):
+        state = stream_state(seed, b)
+        h = 0
+        for i in range(b * block, min(n, (b + 1) * block)):
+            x = next_uniform(state)
+            y = next_uniform(state)
+            if x * x + y * y < 1.0:
+                h += 1
+        hits[b] = h
+    return 4.0 * hits.sum() / n
+
+
+@numba.njit(parallel=True, cache=True)
+def _philox_words(c, k):
+    out = np.empty_like(c)
+    for i in numba.prange(c.shape[0]):
+        out[i, 0], out[i, 1], out[i, 2], out[i, 3] = philox4x32(
+            c[i, 0], c[i, 1], c[i, 2], c[i, 3], k[i, 0], k[i, 1])
+    return out
+
+
+def _rate(func, n, repeat=3):
+    func()
+    best = np.inf
+    for _ in range(repeat):
+        t0 = perf_counter()
+        func()
+        best = min(best, perf_counter() - t0)
+    return n / best
+
+
+if __name__ == '__main__':
+    # known answers of Philox4x32-10 from Random123
+    c = np.array([[0, 0, 0, 0], [0xFFFFFFFF] * 4,
+                  [0x243F6A88, 0x85A308D3, 0x13198A2E, 0x03707344]],
+                 dtype=np.uint64)
+    k = np.array([[0, 0], [0xFFFFFFFF] * 2, [0xA4093822, 0x299F31D0]],
+                 dtype=np.uint64)
+    kat = np.array([[0x6627E8D5, 0xE169C58D, 0xBC57AC4C, 0x9B00DBD8],
+                    [0x408F276D, 0x41C83B0E, 0xA20BC7C6, 0x6D5451FD],
+                    [0xD16CFE09, 0x94FDCCEB, 0x5001E420, 0x24126EA1]],
+                   dtype=np.uint64)
+    if not np.array_equal(_philox_words(c, k), kat):
+        print(f'{sys.argv[0]}: ERROR: Philox4x32-10 known answer test failed',
+              file=sys.stderr)
+        sys.exit(1)
+
+    u = uniform(2, 100_000, 1000)
+    assert all(u[i] == uniform_at(2, i // 1000, i % 1000)
+               for i in range(0, 100_000, 997))
+    assert np.array_equal(u, uniform(2, 100_000, 1000))
+    z = normal(2, 1_000_000)
+    print(f"uniform: mean {u.mean():.4f} var {u.var():.4f} (1/2, 1/12)")
+    print(f"normal:  mean {z.mean():.4f} var {z.var():.4f} (0, 1)")
+
+    nthreads = numba.get_num_threads()
+    pis = set()
+    for t in sorted({1, max(1, nthreads // 2), nthreads}):
+        numba.set_num_threads(t)
+        pis.add(mc_pi_parallel(2, 10_000_000))
+    numba.set_num_threads(nthreads)
+    print(f"mc_pi_parallel with 1..{nthreads} threads: {len(pis)} distinct "
+          f"result(s) {sorted(pis)}")
+
+    print(f"\nMonte Carlo pi, samples/s ({nthreads} threads)")
+    print(f"{'samples':>12} {'serial seeded':>15} {'philox parallel':>16}")
+    for n in [10 ** 5, 10 ** 6, 10 ** 7, 10 ** 8]:
+        r_serial = _rate(lambda: mc_pi_serial(2, n), n)
+        r_philox = _rate(lambda: mc_pi_parallel(2, n), n)
+        print(f"{n:>12.0e} {r_serial:>15.3e} {r_philox:>16.3e}")
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Segmented, parallel Sieve of Eratosthenes with Numba.
+
+`get_prime_numbers_nb` in `prime_numbers.ipynb` tests every integer by trial
+division and appends to a Python list, O(n sqrt(n)) on a single thread. The
+sieve here
+
+- only stores odd numbers, one bit each (n/16 bytes for the range [0, n)),
+- splits the range into cache-sized segments that are sieved independently
+  with `prange`, using the base primes up to sqrt(n),
+- counts the primes of every segment with a popcount table, so the output is
+  written straight into a NumPy array of the right size.
+
+`iter_primes` yields the primes chunk by chunk for ranges whose primes do not
+fit in memory, and `count_primes_below` only counts them.
+
+Run `python sieve.py` to compare against the notebook implementations.
+"""
+
+import math
+import sys
+from time import perf_counter
+
+import numba
+import numpy as np
+
+from warmup import declare
+
+SEGMENT_BYTES = 32 * 1024      # 2^18 odd numbers per segment, fits in L2
+
+# number of set bits of every byte value
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+@declare("(int64,)")
+@numba.njit(cache=True)
+def _base_primes(limit):
+    """Odd primes <= limit with a plain sieve (limit ~ sqrt(n) is small)."""
+    is_prime = np.ones(limit + 1, dtype=np.bool_)
+    is_prime[:3] = False
+    for i in range(2, int(math.sqrt(limit)) + 1):
+        if is_prime[i]:
+            is_prime[i * i::i] = False
+    primes = np.nonzero(is_prime)[0]
+    return primes[primes % 2 == 1]
+
+
+@numba.njit(cache=True)
+def _mark_segment(k0, n, primes, bits):
+    """
+    Sieve the odd numbers 2k+1, k0 <= k < k0+n, into the zeroed bit array
+    `bits` (bit set = composite). Bits past n are set as well.
+    """
+    lo = 2 * k0 + 1
+    last = 2 * (k0 + n) - 1
+    for p in primes:
+        m = p * p
+        if m > last:
+            break
+        if m < lo:
+            m = (lo + p - 1) // p * p
+            if m % 2 == 0:
+                m += p
+        k = (m - 1) // 2 - k0
+        while k < n:          # consecutive odd multiples are p indices apart
+            bits[k >> 3] |= 1 << (k & 7)
+            k += p
+    if k0 == 0:
+        bits[0] |= 1          # 1 is not prime
+    for k in range(n, bits.size * 8):
+        bits[k >> 3] |= 1 << (k & 7)
+
+
+@numba.njit(cache=True)
+def _count_segment(bits):
+    marked = 0
+    for b in bits:
+        marked += POPCOUNT[b]
+    return bits.size * 8 - marked
+
+
+@declare("(int64, int64, int64[::1], int64)")
+@numba.njit(parallel=True, cache=True)
+def _sieve_odd_range(k_lo, k_hi, primes, seg_bits):
+    """Primes 2k+1 for k_lo <= k < k_hi, as an int64 array."""
+    nseg = (k_hi - k_lo + seg_bits - 1) // seg_bits
+    bits = np.zeros((nseg, seg_bits // 8), dtype=np.uint8)
+    counts = np.zeros(nseg, dtype=np.int64)
+    for s in numba.prange(nseg):
+        k0 = k_lo + s * seg_bits
+        _mark_segment(k0, min(seg_bits, k_hi - k0), primes, bits[s])
+        counts[s] = _count_segment(bits[s])
+
+    offsets = np.zeros(nseg + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(counts)
+    out = np.empty(offsets[-1], dtype=np.int64)
+    for s in numba.prange(nseg):
+        k0 = k_lo + s * seg_bits
+        pos = offsets[s]
+        for i in range(bits.shape[1]):
+            b = bits[s, i]
+            if b == 255:
+                continue
+            for j in range(8):
+                if not (b >> j) & 1:
+                    out[pos] = 2 * (k0 + 8 * i + j) + 1
+                    pos += 1
+    return out
+
+
+@declare("(int64, int64, int64[::1], int64)")
+@numba.njit(parallel=True, cache=True)
+def _count_odd_range(k_lo, k_hi, primes, seg_bits):
+    nseg = (k_hi - k_lo + seg_bits - 1) // seg_bits
+    total = 0
+    for s in numba.prange(nseg):
+        k0 = k_lo + s * seg_bits
+        bits = np.zeros(seg_bits // 8, dtype=np.uint8)
+        _mark_segment(k0, min(seg_bits, k_hi - k0), primes, bits)
+        total += _count_segment(bits)
+    return total
+
+
+def _odd_range(lo, hi):
+    """Indices k with lo <= 2k+1 < hi."""
+    return lo // 2, max(lo // 2, hi // 2)
+
+
+def primes_below(upperbound, segment_bytes=SEGMENT_BYTES):
+    """
+    All primes p < upperbound as a NumPy int64 array, same numbers as
+    `get_prime_numbers_nb(upperbound)`.
+    """
+    return primes_in_range(2, upperbound, segment_bytes)
+
+
+def primes_in_range(lo, hi, segment_bytes=SEGMENT_BYTES, base_primes=None):
+    """Primes p with lo <= p < hi."""
+    if base_primes is None:
+        base_primes = _base_primes(math.isqrt(max(hi, 4)) + 1)
+    k_lo, k_hi = _odd_range(lo, hi)
+    odd = _sieve_odd_range(k_lo, k_hi, base_primes, 8 * segment_bytes)
+    if lo <= 2 < hi:
+        return np.concatenate([np.array([2], dtype=np.int64), odd])
+    return odd
+
+
+def count_primes_below(upperbound, segment_bytes=SEGMENT_BYTES):
+    """Number of primes p < upperbound, without materializing them."""
+    if upperbound <= 2:
+        return 0
+    base_primes = _base_primes(math.isqrt(upperbound) + 1)
+    k_lo, k_hi = _odd_range(2, upperbound)
+    return 1 + _count_odd_range(k_lo, k_hi, base_primes, 8 * segment_bytes)
+
+
+def iter_primes(upperbound, lo=2, segments_per_chunk=None,
+                segment_bytes=SEGMENT_BYTES):
+    """
+    Yield the primes lo <= p < upperbound as consecutive NumPy arrays.
+
+    Each chunk spans `segments_per_chunk` segments (default: 4 per thread)
+    that are sieved in parallel, so memory stays bounded by one chunk.
+    """
+    if segments_per_chunk is None:
+        segments_per_chunk = 4 * numba.get_num_threads()
+    span = 2 * 8 * segment_bytes * segments_per_chunk
+    base_primes = _base_primes(math.isqrt(max(upperbound, 4)) + 1)
+    start = lo
+    while start < upperbound:
+        stop = min(upperbound, start + span)
+        yield primes_in_range(start, stop, segment_bytes, base_primes)
+        start = stop
+
+
+# notebook implementations, for the benchmark
+def get_prime_numbers_py(upperbound):
+    r = [x for x in range(2, upperbound) if
+         all(x % i for i in range(2, x))]
+    return r
+
+
+@numba.njit(cache=True)
+def is_prime(n):
+    if n < 2:
+        return False
+    for i in range(2, int(np.sqrt(n)) + 1):
+        if n % i == 0:
+            return False
+    return True
+
+
+@declare("(int64,)")
+@numba.njit(cache=True)
+def get_prime_numbers_nb(upperbound):
+    primes = []
+    for x in range(2, upperbound):
+        if is_prime(x):
+            primes.append(x)
+    return primes
+
+
+def _best_time(func, repeat=3):
+    best = np.inf
+    for _ in range(repeat):
+        t0 = perf_counter()
+        func()
+        best = min(best, perf_counter() - t0)
+    return best
+
+
+if __name__ == '__main__':
+    # validation
+    ref = np.array(get_prime_numbers_nb(100_000))
+    if not np.array_equal(primes_below(100_000), ref):
+        print(f'{sys.argv[0]}: ERROR: sieve does not match trial division',
+              file=sys.stderr)
+        sys.exit(1)
+    assert np.array_equal(np.concatenate(list(
+        iter_primes(100_000, segments_per_chunk=1, segment_bytes=512))), ref)
+    assert count_primes_below(100_000) == len(ref)
+    primes_below(1000)
+    count_primes_below(1000)
+
+    print(f"Prime generation, {numba.get_num_threads()} threads (time in s)")
+    print(f"{'upperbound':>12} {'python':>9} {'numba':>9} {'sieve':>9} "
+          f"{'count':>9} {'pi(n)':>12}")
+    for exp in range(4, 11):
+        n = 10 ** exp
+        t_py = f"{_best_time(lambda: get_prime_numbers_py(n), 1):.4f}" \
+            if n <= 10_000 else "-"
+        t_nb = f"{_best_time(lambda: get_prime_numbers_nb(n), 1):.4f}" \
+            if n <= 10_000_000 else "-"
+        t_sv = f"{_best_time(lambda: primes_below(n)):.4f}" \
+            if n <= 1_000_000_000 else "-"
+        repeat = 3 if n <= 1_000_000_000 else 1
+        t0 = perf_counter()
+        for _ in range(repeat):
+            count = count_primes_below(n)
+        t_ct = (perf_counter() - t0) / repeat
+        print(f"{n:>12.0e} {t_py:>9} {t_nb:>9} {t_sv:>9} {t_ct:>9.4f} "
+              f"{count:>12}")
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Ahead-of-time warm-up of the Numba kernels.
+
+A `@numba.njit` function is compiled on its first call, which for the
+parallel kernels in this directory takes longer than the work of a small job.
+With `cache=True` the machine code is written next to the source
+(`__pycache__/*.nbi, *.nbc`, or under NUMBA_CACHE_DIR) and later processes
+only load it, but the cache is still filled by the first real call.
+
+Kernels declare the signatures they are called with,
+
+    @declare("(float64[:, ::1], float64[:, ::1])")
+    @numba.njit(parallel=True, cache=True)
+    def euclidean_numba_prange(x, y): ...
+
+and `python warmup.py` compiles all of them ahead of time, one kernel per
+fresh process, so the on-disk cache is populated before the first job starts.
+The report lists the compile (or cache load) time of every signature and
+whether it came from the cache. Run it a second time to see the cold-start
+cost of a job that uses the kernels, and `--clear` to start from an empty
+cache. Eagerly compiled ufuncs (`numba.vectorize` with signatures) are
+registered by name with `register` and are built when first accessed.
+
+Jobs can call `warm_start()` at startup to load everything up front.
+"""
+
+import argparse
+import glob
+import importlib
+import importlib.util
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+# modules of this directory with declared kernels
+DEFAULT_MODULES = ("kernels", "sieve", "mandelbrot")
+
+# (module, kernel name) -> signatures, filled by `declare` on import
+REGISTRY = {}
+
+
+def register(module, name, signatures=()):
+    """Register the kernel `module.name`; without signatures it is compiled
+    by accessing it (an eager ufunc)."""
+    REGISTRY[module, name] = tuple(signatures)
+
+
+def declare(*signatures):
+    """Register a jitted kernel (`cache=True`) and the signatures to
+    precompile, e.g. `@declare("(int64,)")` on top of `@numba.njit`."""
+    def wrap(dispatcher):
+        func = dispatcher.py_func
+        register(func.__module__, func.__name__, signatures)
+        return dispatcher
+    return wrap
+
+
+def lookup(module, name):
+    """The registered kernel `module.name`, built if it is an eager ufunc."""
+    if (module, name) not in _registry():
+        raise KeyError(f"{module}.{name} is not a registered kernel")
+    return getattr(importlib.import_module(module), name)
+
+
+def _registry():
+    # The kernel modules import `warmup`, which is not the module that runs
+    # as __main__ (or __mp_main__ in the workers) when used as a script.
+    return importlib.import_module("warmup").REGISTRY
+
+
+def _cache_files(module):
+    """Cached machine code of `module` on disk."""
+    from numba.core import config
+
+    origin = importlib.util.find_spec(module).origin
+    stem = os.path.splitext(os.path.basename(origin))[0]
+    if config.CACHE_DIR:
+        pattern = os.path.join(config.CACHE_DIR, "**", f"{stem}.*.nbc")
+    else:
+        pattern = os.path.join(os.path.dirname(origin), "__pycache__",
+                               f"{stem}.*.nbc")
+    return set(glob.glob(pattern, recursive=True))
+
+
+def _import_module(module):
+    """Import time of `module` and the kernels it declares."""
+    import numba  # noqa: F401, not part of the module's import time
+
+    before = _cache_files(module)
+    t0 = perf_counter()
+    importlib.import_module(module)
+    seconds = perf_counter() - t0
+    n_new = len(_cache_files(module) - before)
+    row = dict(module=module, kernel="<import>", signature="",
+               seconds=seconds, cache="miss" if n_new else "-")
+    kernels = [name for mod, name in _registry() if mod == module]
+    return row, kernels
+
+
+def _warm_kernel(module, name):
+    """Compile or load all declared signatures of one kernel."""
+    mod = importlib.import_module(module)
+    signatures = _registry()[module, name]
+    if not signatures:
+        before = _cache_files(module)
+        t0 = perf_counter()
+        lookup(module, name)
+        seconds = perf_counter() - t0
+        cache = "miss" if _cache_files(module) - before else "hit"
+        return [dict(module=module, kernel=name, signature="<access>",
+                     seconds=seconds, cache=cache)]
+
+    dispatcher = getattr(mod, name)
+    stats = dispatcher.stats
+    rows = []
+    for sig in signatures:
+        hits = sum(stats.cache_hits.values())
+        misses = sum(stats.cache_misses.values())
+        t0 = perf_counter()
+        dispatcher.compile(sig)
+        seconds = perf_counter() - t0
+        if stats.cache_path is None:
+            cache = "uncached"
+        elif sum(stats.cache_hits.values()) > hits:
+            cache = "hit"
+        elif sum(stats.cache_misses.values()) > misses:
+            cache = "miss"
+        else:
+            cache = "memory"    # already compiled as a callee
+        rows.append(dict(module=module, kernel=name, signature=sig,
+                         seconds=seconds, cache=cache))
+    return rows
+
+
+def warm_start(modules=DEFAULT_MODULES):
+    """
+    Import `modules` and compile every declared signature in this process,
+    a cache load per kernel once `python warmup.py` has been run.
+    Returns the report rows.
+    """
+    rows = []
+    for module in modules:
+        row, kernels = _import_module(module)
+        rows.append(row)
+        for name in kernels:
+            rows.extend(_warm_kernel(module, name))
+    return rows
+
+
+def precompile(modules=DEFAULT_MODULES, processes=None):
+    """
+    Populate the on-disk cache for all kernels of `modules`, every kernel in
+    a fresh process. Returns the report rows and the wall time.
+    """
+    t0 = perf_counter()
+    rows = []
+    with ProcessPoolExecutor(processes, max_tasks_per_child=1) as pool:
+        tasks = []
+        for row, kernels in pool.map(_import_module, modules):
+            rows.append(row)
+            tasks += [(row["module"], name) for name in kernels]
+        if tasks:
+            for kernel_rows in pool.map(_warm_kernel, *zip(*tasks)):
+                rows.extend(kernel_rows)
+    return rows, perf_counter() - t0
+
+
+def clear_cache(modules=DEFAULT_MODULES):
+    """Delete the cached machine code of `modules`, return the file count."""
+    n = 0
+    for module in modules:
+        for path in _cache_files(module):
+            for p in (path, path.rsplit(".", 2)[0] + ".nbi"):
+                if os.path.exists(p):
+                    os.remove(p)
+                    n += 1
+    return n
+
+
+def print_report(rows, wall_time=None, file=sys.stdout):
+    w = max(len("signature"), *(len(r["signature"]) for r in rows))
+    print(f"{'module':<11} {'kernel':<27} {'signature':<{w}} {'time (s)':>9} "
+          f"{'cache':>8}", file=file)
+    for r in rows:
+        print(f"{r['module']:<11} {r['kernel']:<27} {r['signature']:<{w}} "
+              f"{r['seconds']:>9.3f} {r['cache']:>8}", file=file)
+    n_hit = sum(r["cache"] == "hit" for r in rows)
+    n_miss = sum(r["cache"] == "miss" for r in rows)
+    total = sum(r["seconds"] for r in rows)
+    print(f"\n{n_hit} cache hits, {n_miss} misses, {total:.2f} s of "
+          f"import/compile time", file=file, end="")
+    if wall_time is not None:
+        print(f", {wall_time:.2f} s wall time", file=file, end="")
+    print(file=file)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES,
+                        help="modules with declared kernels "
+                             f"(default: {' '.join(DEFAULT_MODULES)})")
+    parser.add_argument("-j", "--processes", type=int, default=None,
+                        help="parallel compile processes (default: all cores)")
+    parser.add_argument("--clear", action="store_true",
+                        help="delete the cached kernels before compiling")
+    parser.add_argument("--in-process", action="store_true",
+                        help="load everything in this process, as a job "
+                             "calling warm_start() would")
+    parser.add_argument("--json", metavar="PATH",
+                        help="also write the report rows as JSON")
+    args = parser.parse_args()
+
+    if args.clear:
+        print(f"removed {clear_cache(args.modules)} cache files")
+    if args.in_process:
+        t0 = perf_counter()
+        rows = warm_start(args.modules)
+        wall_time = perf_counter() - t0
+    else:
+        rows, wall_time = precompile(args.modules, args.processes)
+    print_report(rows, wall_time)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(dict(rows=rows, wall_time=wall_time), f, indent=2)